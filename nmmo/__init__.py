@@ -9,6 +9,8 @@ from .io.action import Action
 from .core import config, agent
 from .core.agent import Agent
 from .core.env import Env
+from .core.batched_env import BatchedEnv
+from .core.vec_env import VecEnv
 from .core.terrain import MapGenerator, Terrain
 
 MOTD = rf'''      ___           ___           ___           ___
@@ -23,7 +25,7 @@ MOTD = rf'''      ___           ___           ___           ___
     \  \:\        \  \:\        \  \:\        \  \::/     maintained at MIT in
      \__\/         \__\/         \__\/         \__\/      Phillip Isola's lab '''
 
-__all__ = ['Env', 'config', 'agent', 'Agent', 'MapGenerator', 'Terrain',
+__all__ = ['Env', 'BatchedEnv', 'VecEnv', 'config', 'agent', 'Agent', 'MapGenerator', 'Terrain',
         'action', 'Action', 'material', 'spawn',
         'Overlay', 'OverlayRegistry']
 
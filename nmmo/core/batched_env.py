@@ -0,0 +1,92 @@
+import numpy as np
+
+from nmmo.core.env import Env
+from nmmo.core.observation import ObservationBuffers
+
+"""
+An Env for vectorized learners: the observations of all agents come
+as one array per key instead of one dict per agent.
+
+Agents are ordered as in possible_agents. Dead agents keep their slot,
+with zeroed observations and a False mask:
+
+  env = BatchedEnv(config)
+  obs = env.reset()
+  obs["Tile"]       # float32 array of (num_agents, MAP_N_OBS, attributes)
+  obs["Mask"]       # True for the agents that have an observation
+  obs, rewards, dones, infos = env.step(actions)
+  rewards, dones    # float32 and bool arrays of (num_agents,)
+
+With OBS_RAGGED_ENTITIES, Entity is replaced by the unpadded rows of
+all agents, and the offsets of each agent's rows in them:
+
+  obs["EntityValues"][obs["EntityOffsets"][i]:obs["EntityOffsets"][i+1]]
+  pad_ragged(obs["EntityValues"], obs["EntityOffsets"], config.PLAYER_N_OBS)
+
+The arrays are refilled in place every step, copy them to keep them.
+"""
+
+# pylint: disable=abstract-method
+class BatchedEnv(Env):
+  '''Env that returns the observations, rewards and dones of all agents
+  as arrays in the order of possible_agents'''
+
+  def __init__(self, config=None, seed=None):
+    super().__init__(config, seed)
+    config = self.config
+    num_agents = len(self.possible_agents)
+    self.agent_ids = np.array(self.possible_agents)
+    self._batch = ObservationBuffers(
+      config, self.possible_agents, ragged_entities=config.OBS_RAGGED_ENTITIES)
+    self._market = None
+    if config.EXCHANGE_SYSTEM_ENABLED:
+      # all agents share one read-only market, dead ones included
+      self._market = np.broadcast_to(
+        self._batch.market, (num_agents, *self._batch.market.shape))
+    self._tick = np.zeros(num_agents, dtype=np.int64)
+    self._rewards = np.zeros(num_agents, dtype=np.float32)
+    self._dones = np.zeros(num_agents, dtype=bool)
+
+  def step(self, actions):
+    '''Same as Env.step(), with the rewards and dones as arrays. dones
+    stays True for the agents that died earlier'''
+    obs, rewards, _, infos = super().step(actions)
+
+    slots = self._batch.slots
+    self._rewards[:] = 0
+    for eid, reward in rewards.items():
+      self._rewards[slots[eid]] = reward
+    self._dones[:] = False
+    for eid in self._dead_agents:
+      self._dones[slots[eid]] = True
+
+    return obs, self._rewards, self._dones, infos
+
+  def _gym_obs(self):
+    batch = self._batch
+    batch.fill(self.obs, self.config.PROVIDE_ACTION_TARGETS)
+    self._tick[:] = self.realm.tick
+
+    gym_obs = {
+      "CurrentTick": self._tick,
+      "AgentId": self.agent_ids,
+      "Mask": batch.mask,
+      **batch.blocks,
+    }
+    if self._market is not None:
+      gym_obs["Market"] = self._market
+    if batch.ragged_entities:
+      gym_obs["EntityValues"] = batch.entity_values
+      gym_obs["EntityOffsets"] = batch.entity_offsets
+
+    if self.config.PROVIDE_ACTION_TARGETS:
+      gym_obs["ActionTargets"] = batch.action_targets
+
+    if self._task_encoding:
+      task = np.zeros((len(self.agent_ids), self._task_embedding_size), dtype=np.float32)
+      for eid, embedding in self._encode_goal().items():
+        if eid in batch.slots:
+          task[batch.slots[eid]] = embedding
+      gym_obs["Task"] = task
+
+    return gym_obs
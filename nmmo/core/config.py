@@ -151,6 +151,26 @@ class Config(Template):
   PROVIDE_ACTION_TARGETS       = False
   '''Flag used to provide action targets mask'''
 
+  OBS_BUFFERS                  = False
+  '''Flag used to write the gym observations into float32 buffers that are
+  allocated on reset and reused every step. The returned observations are
+  views of the buffers, overwritten by the next step'''
+
+  OBS_LAZY                     = False
+  '''Flag used to return the gym observations as mappings that compute
+  each key, and each action targets mask, when it is first read. Useful
+  when the consumers, e.g. scripted agents, read few or no keys'''
+
+  OBS_RAGGED_ENTITIES          = False
+  '''Flag used to make BatchedEnv return the entity observations without
+  padding, as EntityValues and EntityOffsets (see pack_ragged())'''
+
+  TILE_OBS_FORMAT              = 'list'
+  '''Format of the Tile observation. 'list' has one (row, col, material_id)
+  row per visible tile. 'grid' is a (2r+1, 2r+1, 1) int8 tensor of the
+  material ids around the agent, and 'onehot' a (2r+1, 2r+1, MAP_N_TILE)
+  int8 tensor of one-hot materials. Tiles outside the map are lava'''
+
   PLAYERS                      = [Agent]
   '''Player classes from which to spawn'''
 
@@ -187,6 +207,14 @@ class Config(Template):
   LOG_FILE                     = None
   '''Where to write logs (defaults to console)'''
 
+  DATASTORE_SHARED_MEMORY      = False
+  '''Keep the datastore tables in shared memory, so that other processes can
+  map them with nmmo.datastore.shared_memory_datastore.SharedMemoryReader'''
+
+  DATASTORE_SHRINK_ON_RESET    = False
+  '''Shrink the tables on reset to twice the rows used in the last episode.
+  By default they keep their size, which saves reallocating them'''
+
 
   ############################################################################
   ### Player Parameters
@@ -197,6 +225,10 @@ class Config(Template):
   PLAYER_N_OBS                 = 100
   '''Number of distinct agent observations'''
 
+  PLAYER_OBS_NEAREST           = False
+  '''Flag used to observe the PLAYER_N_OBS entities nearest to the agent,
+  by L-inf distance, instead of the first ones in the datastore'''
+
   @property
   def PLAYER_POLICIES(self):
     '''Number of player policies'''
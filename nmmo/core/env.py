@@ -1,4 +1,5 @@
 import functools
+import itertools
 import random
 import copy
 from typing import Any, Dict, List, Optional, Union, Tuple
@@ -10,11 +11,14 @@ from pettingzoo.utils.env import AgentID, ParallelEnv
 
 import nmmo
 from nmmo.core.config import Default
-from nmmo.core.observation import Observation
+from nmmo.io import action
+from nmmo.core.observation import (Observation, ObservationBuffers, make_action_targets,
+                                   shared_market, tile_obs_shape, tile_tensor)
 from nmmo.core.tile import Tile
 from nmmo.entity.entity import Entity
 from nmmo.systems.item import Item
 from nmmo.core import realm
+from nmmo.core.snapshot import EnvSnapshot
 from nmmo.task.game_state import GameStateGenerator
 from nmmo.task.task_api import Task
 from nmmo.task.scenario import default_task
@@ -25,14 +29,16 @@ class Env(ParallelEnv):
 
   #pylint: disable=no-value-for-parameter
   def __init__(self,
-    config: Default = nmmo.config.Default(), seed=None):
+    config: Default = None, seed=None):
     self._init_random(seed)
+    config = config or Default()
 
     super().__init__()
 
     self.config = config
     self.realm = realm.Realm(config)
     self.obs = None
+    self._obs_buffers = None
 
     self.possible_agents = list(range(1, config.PLAYER_N + 1))
     self._dead_agents = OrderedSet()
@@ -78,6 +84,12 @@ class Env(ParallelEnv):
       "Entity": box(self.config.PLAYER_N_OBS, Entity.State.num_attributes),
     }
 
+    if self.config.TILE_OBS_FORMAT != "list":
+      obs_space["Tile"] = gym.spaces.Box(
+          low=0, high=self.config.MAP_N_TILE - 1 if self.config.TILE_OBS_FORMAT == "grid" else 1,
+          shape=tile_obs_shape(self.config),
+          dtype=np.int8)
+
     if self.config.ITEM_SYSTEM_ENABLED:
       obs_space["Inventory"] = box(self.config.INVENTORY_N_OBS, Item.State.num_attributes)
 
@@ -147,6 +159,7 @@ class Env(ParallelEnv):
       reset: Resets the environment
     """
     self._tasks = [t if isinstance(t, Tuple) else (t,1) for t in new_tasks]
+    self.tasks = None
     self._task_encoding = task_encoding
     self._task_embedding_size = embedding_size
     if reset:
@@ -167,6 +180,11 @@ class Env(ParallelEnv):
         observations, as documented by _compute_observations()
 
     Notes:
+        The Player objects and the reusable tasks of the last episode are
+        reset in place, not replaced. A reference to env.realm.players[i]
+        kept from the last episode is agent i of the new episode after
+        reset(), so copy what you need from it before resetting.
+
         Neural MMO simulates a persistent world. Ideally, you should reset
         the environment only once, upon creation. In practice, this approach
         limits the number of parallel environment simulations to the number
@@ -181,20 +199,23 @@ class Env(ParallelEnv):
     self._dead_agents = OrderedSet()
 
     # check if there are scripted agents
+    self.scripted_agents = OrderedSet()
     for eid, ent in self.realm.players.items():
       if isinstance(ent.agent, Scripted):
         self.scripted_agents.add(eid)
 
-    self.tasks = copy.deepcopy(self._tasks)
+    # The tasks are copied every episode, unless they can all be reset in place
+    if self.tasks is None or not all(task.reusable for task, _ in self.tasks):
+      self.tasks = copy.deepcopy(self._tasks)
+    else:
+      for task, _ in self.tasks:
+        task.reset()
+    if self.config.OBS_BUFFERS and self._obs_buffers is None:
+      self._obs_buffers = ObservationBuffers(self.config, self.possible_agents)
     self.obs = self._compute_observations()
-    self._gamestate_generator = GameStateGenerator(self.realm, self.config)
+    self._gamestate_generator.reset(self.realm)
 
-    gym_obs = {}
-    for a, o in self.obs.items():
-      gym_obs[a] = o.to_gym()
-      if self._task_encoding:
-        gym_obs[a]['Task'] = self._encode_goal().get(a,np.zeros(self._task_embedding_size))
-    return gym_obs
+    return self._gym_obs()
 
   def step(self, actions: Dict[int, Dict[str, Dict[str, Any]]]):
     '''Simulates one game tick or timestep
@@ -228,6 +249,13 @@ class Env(ParallelEnv):
           Perform this conditional processing to make batched action
           computation easier.
 
+          actions can also be an int array of (len(possible_agents),
+          len(action.argument_columns(config))), with one column per (action,
+          argument) in the order of action_space(). The values index the
+          Discrete spaces, as the ActionTargets masks do, and an action
+          with any negative argument is not taken. This is the fast path:
+          it decodes the actions of all agents at once
+
     Returns:
         (dict, dict, dict, None):
 
@@ -289,13 +317,20 @@ class Env(ParallelEnv):
           Provided for conformity with PettingZoo
     '''
     assert self.obs is not None, 'step() called before reset'
-    # Add in scripted agents' actions, if any
-    if self.scripted_agents:
-      actions = self._compute_scripted_agent_actions(actions)
-
-    # Drop invalid actions of BOTH neural and scripted agents
-    #   we don't need _deserialize_scripted_actions() anymore
-    actions = self._validate_actions(actions)
+    if isinstance(actions, np.ndarray):
+      decoded = self._decode_actions(actions)
+      # the scripted agents' actions override the array ones
+      if self.scripted_agents:
+        decoded.update(self._validate_actions(self._compute_scripted_agent_actions({})))
+      actions = decoded
+    else:
+      # Add in scripted agents' actions, if any
+      if self.scripted_agents:
+        actions = self._compute_scripted_agent_actions(actions)
+
+      # Drop invalid actions of BOTH neural and scripted agents
+      #   we don't need _deserialize_scripted_actions() anymore
+      actions = self._validate_actions(actions)
     # Execute actions
     self.realm.step(actions)
     dones = {}
@@ -309,16 +344,30 @@ class Env(ParallelEnv):
 
     # Store the observations, since actions reference them
     self.obs = self._compute_observations()
-    gym_obs = {}
-    for a, o in self.obs.items():
-      gym_obs[a] = o.to_gym()
-      if self._task_encoding:
-        gym_obs[a]['Task'] = self._encode_goal()[a]
-
+    gym_obs = self._gym_obs()
     rewards, infos = self._compute_rewards(self.obs.keys(), dones)
 
     return gym_obs, rewards, dones, infos
 
+  def snapshot(self) -> EnvSnapshot:
+    '''Saves the state of the simulation for restore()
+
+    Captures the datastore tables, the map's depleted tiles, the
+    entities and items, the exchange listings, the task scores and the
+    global random generators, so that branching rollouts can start from
+    the same tick without replaying it from reset()'''
+    assert self.obs is not None, 'snapshot() called before reset'
+    return EnvSnapshot(self)
+
+  def restore(self, snapshot: EnvSnapshot):
+    '''Rewinds the simulation to a snapshot() of this env
+
+    A snapshot can be restored any number of times. Returns the
+    observations of the snapshot's tick, as reset() does'''
+    snapshot.restore(self)
+
+    return self._gym_obs()
+
   def _validate_actions(self, actions: Dict[int, Dict[str, Dict[str, Any]]]):
     '''Deserialize action arg values and validate actions
        For now, it does a basic validation (e.g., value is not none).
@@ -359,6 +408,65 @@ class Env(ParallelEnv):
 
     return validated_actions
 
+  def _decode_actions(self, actions: np.ndarray):
+    '''Deserialize the array actions of possible_agents, as _validate_actions()
+    does the action dicts, looking up the entity, inventory and market rows
+    of all agents at once in the current observations'''
+    columns = action.argument_columns(self.config)
+    assert actions.shape == (len(self.possible_agents), len(columns)), \
+      f"Expected actions of shape {(len(self.possible_agents), len(columns))}"
+    slots = [slot for slot, eid in enumerate(self.possible_agents) if eid in self.obs]
+    obs = [self.obs[self.possible_agents[slot]] for slot in slots]
+    actions = actions[slots].astype(np.int64)
+
+    def stack_ids(rows, num_cols):
+      ids = np.zeros((len(rows), num_cols + 1), dtype=np.int64)
+      for i, row in enumerate(rows):
+        ids[i, :len(row)] = row
+      return ids
+
+    # the ids of the rows the arguments point to, 0 past the last row
+    ids = {}
+    if self.config.COMBAT_SYSTEM_ENABLED or self.config.ITEM_SYSTEM_ENABLED:
+      ids[action.Target] = stack_ids([ob.entities.ids for ob in obs], self.config.PLAYER_N_OBS)
+    if self.config.ITEM_SYSTEM_ENABLED:
+      ids[action.InventoryItem] = stack_ids(
+        [ob.inventory.ids for ob in obs], self.config.INVENTORY_N_OBS)
+    if self.config.EXCHANGE_SYSTEM_ENABLED and obs:
+      market = stack_ids([obs[0].market.ids], self.config.MARKET_N_OBS)
+      ids[action.MarketItem] = np.broadcast_to(market, (len(obs), market.shape[1]))
+
+    agent_ids = [self.possible_agents[slot] for slot in slots]
+    decoded = {agent_id: {} for agent_id in agent_ids}
+    rows = np.arange(len(obs))
+    col = 0
+    for atn, group in itertools.groupby(columns, key=lambda column: column[0]):
+      args = [arg for _, arg in group]
+      values = actions[:, col:col + len(args)]
+      col += len(args)
+
+      # the valid actions first, then the objects of their arguments
+      valid = (values >= 0).all(axis=1)
+      objs, lookups = [], []
+      for arg, vals in zip(args, values.T):
+        arg_ids = ids.get(arg)
+        if arg_ids is not None:
+          vals = arg_ids[rows, np.minimum(vals, arg_ids.shape[1] - 1)]
+          valid &= vals != 0
+          lookups.append(self.realm.entity_or_none if arg is action.Target
+                         else self.realm.items.get)
+        else:
+          valid &= vals < len(arg.edges)
+          lookups.append(arg.edges.__getitem__)
+        objs.append(vals.tolist())
+
+      for i in np.flatnonzero(valid).tolist():
+        atn_args = [lookup(vals[i]) for lookup, vals in zip(lookups, objs)]
+        if not any(obj is None for obj in atn_args):
+          decoded[agent_ids[i]][atn] = dict(zip(args, atn_args))
+
+    return decoded
+
   def _compute_scripted_agent_actions(self, actions: Dict[int, Dict[str, Dict[str, Any]]]):
     '''Compute actions for scripted agents and add them into the action dict'''
     for eid in self.scripted_agents:
@@ -397,22 +505,45 @@ class Env(ParallelEnv):
 
     obs = {}
 
+    # Apply the writes buffered during the tick before reading the tables
+    self.realm.datastore.flush()
     market = Item.Query.for_sale(self.realm.datastore)
-
-    for agent in self.realm.players.values():
+    # Padded once, and shared by all agents
+    market_obs = None
+    if self.config.EXCHANGE_SYSTEM_ENABLED:
+      market_obs = self._obs_buffers.write_market(market) if self._obs_buffers \
+        else shared_market(self.config, market)
+
+    agents = list(self.realm.players.values())
+    rows = [agent.row.val for agent in agents]
+    cols = [agent.col.val for agent in agents]
+    tiles = Tile.Query.windows(
+        self.realm.datastore, rows, cols, self.config.PLAYER_VISION_RADIUS)
+    # The egocentric material grids of all agents, and their tensors
+    grids = Tile.Query.material_grids(
+        self.realm.datastore, rows, cols, self.config.PLAYER_VISION_RADIUS)
+    tensors = [None] * len(agents)
+    if self.config.TILE_OBS_FORMAT != "list":
+      tensors = tile_tensor(self.config, grids)
+
+    for agent, visible_tiles, grid, tensor in zip(agents, tiles, grids, tensors):
       agent_id = agent.id.val
       agent_r = agent.row.val
       agent_c = agent.col.val
 
-      visible_entities = Entity.Query.window(
-          self.realm.datastore,
-          agent_r, agent_c,
-          self.config.PLAYER_VISION_RADIUS
-      )
-      visible_tiles = Tile.Query.window(
-          self.realm.datastore,
-          agent_r, agent_c,
-          self.config.PLAYER_VISION_RADIUS)
+      if self.config.PLAYER_OBS_NEAREST:
+        visible_entities = Entity.Query.window_nearest(
+            self.realm.datastore,
+            agent_r, agent_c,
+            self.config.PLAYER_VISION_RADIUS,
+            self.config.PLAYER_N_OBS, agent_id
+        )
+      else:
+        visible_entities = Entity.Query.window(
+            self.realm.datastore,
+            agent_r, agent_c,
+            self.config.PLAYER_VISION_RADIUS
+        )
 
       inventory = Item.Query.owned_by(self.realm.datastore, agent_id)
 
@@ -421,9 +552,38 @@ class Env(ParallelEnv):
                                   agent_id,
                                   visible_tiles,
                                   visible_entities,
-                                  inventory, market)
+                                  inventory, market, market_obs,
+                                  tile_grid=grid, tile_obs=tensor)
     return obs
 
+  def _gym_obs(self):
+    '''Converts the observations of the tick to the gym format'''
+    if self.config.OBS_LAZY:
+      # Per agent masks, which are only made if they are read
+      gym_obs = {a: o.to_gym(self._obs_buffers, lazy=True) for a, o in self.obs.items()}
+    else:
+      gym_obs = {a: o.to_gym(self._obs_buffers, action_targets=False)
+                 for a, o in self.obs.items()}
+
+    if self.config.PROVIDE_ACTION_TARGETS and gym_obs and not self.config.OBS_LAZY:
+      # The masks of all agents are made at once
+      agents = list(gym_obs)
+      def stack(key):
+        if key not in gym_obs[agents[0]]:
+          return None
+        return np.stack([gym_obs[a][key] for a in agents])
+      masks = make_action_targets(
+        self.config, self.realm.tick, agents, stack("Tile"), stack("Entity"),
+        stack("Inventory"), gym_obs[agents[0]].get("Market"))
+      for idx, a in enumerate(agents):
+        gym_obs[a]["ActionTargets"] = {
+          atn: {arg: mask[idx] for arg, mask in args.items()} for atn, args in masks.items()}
+
+    if self._task_encoding:
+      for a, obs in gym_obs.items():
+        obs['Task'] = self._encode_goal().get(a, np.zeros(self._task_embedding_size))
+    return gym_obs
+
   def _encode_goal(self):
     return self._task_encoding
 
@@ -3,7 +3,7 @@ import logging
 
 import numpy as np
 from ordered_set import OrderedSet
-from nmmo.core.tile import Tile
+from nmmo.core.tile import Tile, TileState
 
 from nmmo.lib import material
 
@@ -17,8 +17,12 @@ class Map:
     self.config = config
     self._repr  = None
     self.realm  = realm
+    self.map_id = None
     self.update_list = None
 
+    # Material indices of the current map, as loaded
+    self._materials = None
+
     sz          = config.MAP_SIZE
     self.tiles  = np.zeros((sz, sz), dtype=object)
 
@@ -43,12 +47,44 @@ class Map:
     return self._repr
 
   def reset(self, map_id):
-    '''Reuse the current tile objects to load a new map'''
+    '''Reuse the current tile objects to load a new map
+
+    Only the tiles that differ from the new map, were depleted or hold
+    entities are reset, so resetting to the same map is cheap'''
     config = self.config
+    map_file = self._load(map_id)
+
+    if self._materials is None:
+      changed = range(map_file.size)
+    else:
+      sz = config.MAP_SIZE
+      changed = set(np.flatnonzero(map_file != self._materials))
+      changed.update(r*sz + c for r, c in self._dirty_positions())
+
+    materials = {mat.index: mat for mat in material.All}
+    flat_file = map_file.ravel()
+    for idx in changed:
+      self.tiles.flat[idx].reset(materials[flat_file[idx]], config)
+
+    self.map_id = map_id
     self.update_list = OrderedSet()
+    self._materials = map_file
+    self._repr = None
+
+  def _dirty_positions(self):
+    '''Positions of the tiles that changed since they were loaded'''
+    realm = self.realm
+    yield from (tile.pos for tile in self.update_list)
+    yield from (ent.pos for group in (realm.players, realm.npcs)
+                for ent in group.entities.values())
+
+  def _load(self, map_id):
+    # Only the current map is kept, in the dtype of the tiles' materials
+    if map_id == self.map_id:
+      return self._materials
 
-    path_map_suffix = config.PATH_MAP_SUFFIX.format(map_id)
-    f_path = os.path.join(config.PATH_CWD, config.PATH_MAPS, path_map_suffix)
+    path_map_suffix = self.config.PATH_MAP_SUFFIX.format(map_id)
+    f_path = os.path.join(self.config.PATH_CWD, self.config.PATH_MAPS, path_map_suffix)
 
     try:
       map_file = np.load(f_path)
@@ -56,13 +92,7 @@ class Map:
       logging.error('Maps not found')
       raise
 
-    materials = {mat.index: mat for mat in material.All}
-    for r, row in enumerate(map_file):
-      for c, idx in enumerate(row):
-        mat  = materials[idx]
-        tile = self.tiles[r, c]
-        tile.reset(mat, config)
-    self._repr = None
+    return map_file.astype(TileState.State.dtypes[TileState.State.attr_name_to_col["material_id"]])
 
   def step(self):
     '''Evaluate updatable tiles'''
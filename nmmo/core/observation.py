@@ -1,4 +1,6 @@
-from functools import lru_cache
+from collections.abc import MutableMapping
+import functools
+from types import SimpleNamespace
 
 import numpy as np
 
@@ -9,6 +11,32 @@ import nmmo.systems.item as item_system
 from nmmo.io import action
 from nmmo.lib import material, utils
 
+SKILL_LEVELS = ["melee_level", "range_level", "mage_level",
+                "fishing_level", "herbalism_level", "prospecting_level",
+                "carving_level", "alchemy_level"]
+
+# Skill whose level an item requires, None for the highest of all skills
+ITEM_SKILL = {
+  item_system.Hat: None,
+  item_system.Top: None,
+  item_system.Bottom: None,
+  item_system.Sword: "melee_level",
+  item_system.Bow: "range_level",
+  item_system.Wand: "mage_level",
+  item_system.Rod: "fishing_level",
+  item_system.Gloves: "herbalism_level",
+  item_system.Pickaxe: "prospecting_level",
+  item_system.Chisel: "carving_level",
+  item_system.Arcane: "alchemy_level",
+  item_system.Scrap: "melee_level",
+  item_system.Shaving: "range_level",
+  item_system.Shard: "mage_level",
+  item_system.Ration: None,
+  item_system.Poultice: None,
+}
+
+AMMO = [item_system.Scrap, item_system.Shaving, item_system.Shard]
+
 
 class BasicObs:
   def __init__(self, values, id_col):
@@ -37,6 +65,417 @@ class InventoryObs(BasicObs):
     return idx[0] if len(idx) else None
 
 
+class LazyObs(MutableMapping):
+  '''Observation dict whose values are computed on first access
+
+  Takes {key: function} and calls each function at most once, so that
+  the consumers only pay for the keys they read. Keys that are set
+  directly are stored as they are'''
+  def __init__(self, makers):
+    self._makers = dict(makers)
+    self._values = {}
+
+  def __getitem__(self, key):
+    if key not in self._values:
+      self._values[key] = self._makers[key]()
+    return self._values[key]
+
+  def __setitem__(self, key, value):
+    self._makers[key] = None
+    self._values[key] = value
+
+  def __delitem__(self, key):
+    del self._makers[key]
+    self._values.pop(key, None)
+
+  def __iter__(self):
+    return iter(self._makers)
+
+  def __len__(self):
+    return len(self._makers)
+
+  def __repr__(self):
+    return f"LazyObs({list(self._makers)})"
+
+
+def tile_obs_shape(config):
+  '''Shape of the Tile observation in the config's TILE_OBS_FORMAT'''
+  diameter = config.PLAYER_VISION_DIAMETER
+  if config.TILE_OBS_FORMAT == "list":
+    return (config.MAP_N_OBS, TileState.State.num_attributes)
+  if config.TILE_OBS_FORMAT == "grid":
+    return (diameter, diameter, 1)
+  if config.TILE_OBS_FORMAT == "onehot":
+    return (diameter, diameter, config.MAP_N_TILE)
+  raise ValueError(f"Unknown TILE_OBS_FORMAT {config.TILE_OBS_FORMAT}")
+
+
+def tile_tensor(config, grids):
+  '''The egocentric Tile observations of the 'grid' and 'onehot' formats,
+  as int8 arrays of (..., 2r+1, 2r+1, channels), from the material grids
+  of one or many agents'''
+  if config.TILE_OBS_FORMAT == "grid":
+    return grids[..., None].astype(np.int8)
+  if config.TILE_OBS_FORMAT == "onehot":
+    return (grids[..., None] == np.arange(config.MAP_N_TILE)).astype(np.int8)
+  raise ValueError(f"TILE_OBS_FORMAT {config.TILE_OBS_FORMAT} is not a tensor")
+
+
+def shared_market(config, market, out=None):
+  '''The market padded to MARKET_N_OBS rows, built once per tick for all
+  agents. It is read-only, since every agent's observation holds it.
+  out, if given, is refilled in place'''
+  market = market[0:config.MARKET_N_OBS]
+  if out is None:
+    out = np.zeros((config.MARKET_N_OBS, ItemState.State.num_attributes))
+  else:
+    out.setflags(write=True)
+  out[:len(market)] = market
+  out[len(market):] = 0
+  out.setflags(write=False)
+  return out
+
+
+def pack_ragged(arrays, dtype=np.float32):
+  '''Packs (rows_i, attributes) arrays without padding, CSR style: one
+  (sum of rows_i, attributes) values array, and len(arrays) + 1 offsets
+  so that arrays[i] is values[offsets[i]:offsets[i+1]]'''
+  offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+  np.cumsum([len(values) for values in arrays], out=offsets[1:])
+  values = np.concatenate(arrays).astype(dtype, copy=False)
+  return values, offsets
+
+
+def pad_ragged(values, offsets, num_rows):
+  '''The arrays of pack_ragged() zero-padded to num_rows, stacked as the
+  gym observations, i.e. (len(offsets) - 1, num_rows, attributes)'''
+  counts = np.diff(offsets)
+  padded = np.zeros((len(counts), num_rows, values.shape[1]), dtype=values.dtype)
+  index = np.repeat(np.arange(len(counts)), counts)
+  row = np.arange(len(values)) - np.repeat(offsets[:-1], counts)
+  keep = row < num_rows
+  padded[index[keep], row[keep]] = values[keep]
+  return padded
+
+
+class ObservationBuffers:
+  '''Persistent float32 arrays for the gym observations of all agents
+
+  Each key gets one (num_agents, rows, attributes) block, and each agent
+  a slot in it, which write() fills in place. The market is the same
+  for all agents, so it is a single read-only array. With
+  ragged_entities, fill() packs the entities with pack_ragged() into
+  entity_values and entity_offsets instead of an Entity block'''
+  def __init__(self, config, agents, ragged_entities=False):
+    self.config = config
+    self.slots = {agent_id: slot for slot, agent_id in enumerate(agents)}
+    shapes = {"Tile": tile_obs_shape(config)}
+    if not ragged_entities:
+      shapes["Entity"] = (config.PLAYER_N_OBS, EntityState.State.num_attributes)
+    if config.ITEM_SYSTEM_ENABLED:
+      shapes["Inventory"] = (config.INVENTORY_N_OBS, ItemState.State.num_attributes)
+    self.blocks = {key: np.zeros((len(agents), *shape), dtype=np.float32)
+                   for key, shape in shapes.items()}
+    if config.TILE_OBS_FORMAT != "list":
+      self.blocks["Tile"] = self.blocks["Tile"].astype(np.int8)
+    self.market = None
+    if config.EXCHANGE_SYSTEM_ENABLED:
+      self.market = shared_market(config, np.zeros((0, ItemState.State.num_attributes)),
+        np.zeros((config.MARKET_N_OBS, ItemState.State.num_attributes), dtype=np.float32))
+    self.ragged_entities = ragged_entities
+    self.entity_values = None
+    self.entity_offsets = None
+    self.mask = np.zeros(len(agents), dtype=bool)
+    self.action_targets = None
+
+  def write(self, key, agent_id, values):
+    buffer = self.blocks[key][self.slots[agent_id]]
+    num_rows = values.shape[0]
+    buffer[:num_rows] = values
+    buffer[num_rows:] = 0
+    return buffer
+
+  def write_market(self, market):
+    return shared_market(self.config, market, self.market)
+
+  def fill(self, obs, action_targets=False):
+    '''Write the observations of all agents, and zero the slots of the
+    agents without one. mask tells which slots were filled'''
+    self.mask[:] = False
+    for agent_id, ob in obs.items():
+      self.mask[self.slots[agent_id]] = True
+      self.write("Tile", agent_id, ob.tile_obs())
+      if not self.ragged_entities:
+        self.write("Entity", agent_id, ob.entities.values)
+      if "Inventory" in self.blocks:
+        self.write("Inventory", agent_id, ob.inventory.values)
+
+    # All agents see the same market
+    if self.market is not None and obs:
+      self.write_market(next(iter(obs.values())).market.values)
+
+    for block in self.blocks.values():
+      block[~self.mask] = 0
+
+    entities = self.blocks.get("Entity")
+    if self.ragged_entities:
+      # the agents without an observation see no entities
+      empty = np.zeros((0, EntityState.State.num_attributes))
+      self.entity_values, self.entity_offsets = pack_ragged(
+        [obs[agent_id].entities.values if agent_id in obs else empty
+         for agent_id in self.slots])
+      if action_targets:
+        entities = pad_ragged(
+          self.entity_values, self.entity_offsets, self.config.PLAYER_N_OBS)
+
+    if action_targets:
+      current_tick = next(iter(obs.values())).current_tick if obs else 0
+      self.action_targets = make_action_targets(
+        self.config, current_tick, list(self.slots), self.blocks["Tile"],
+        entities, self.blocks.get("Inventory"), self.market)
+      for masks in self.action_targets.values():
+        for mask in masks.values():
+          mask[~self.mask] = 0
+
+
+def make_action_targets(config, current_tick, agent_ids, tiles, entities,
+                        inventory=None, market=None):
+  '''Observation._make_action_targets() of many agents at once
+
+  Takes the padded observation arrays of the agents, stacked as
+  (num_agents, rows, attributes), except for the market which all agents
+  share, and returns the masks stacked the same way, as
+  {action: {argument: (num_agents, n) int8 array}}'''
+  return _BatchedActionTargets(
+    config, current_tick, agent_ids, tiles, entities, inventory, market).masks()
+
+
+class _BatchedActionTargets:
+  # pylint: disable=too-many-instance-attributes
+  def __init__(self, config, current_tick, agent_ids, tiles, entities, inventory, market):
+    self.config = config
+    self.agent_ids = np.asarray(agent_ids)
+    self.tiles = tiles
+    self.entities = entities
+    self.inventory = inventory
+    self.market = market
+    self.num_agents = len(self.agent_ids)
+
+    # The agent's own row of its entity observation. Agents without one
+    # have no position, and no valid targets
+    ent_ids = entities[:, :, EntityState.State.attr_name_to_col["id"]]
+    self.visible = ent_ids != 0
+    self.is_me = ent_ids == self.agent_ids[:, None]
+    self.has_self = self.is_me.any(axis=1)
+    self.agent = entities[np.arange(self.num_agents), self.is_me.argmax(axis=1)]
+    self.agent[~self.has_self] = 0
+    self.gold = self._agent_attr("gold").astype(np.int64)
+
+    if config.COMBAT_SYSTEM_ENABLED:
+      latest_combat_tick = self._agent_attr("latest_combat_tick")
+      self.in_combat = (latest_combat_tick != 0) & \
+        (current_tick - latest_combat_tick < config.COMBAT_STATUS_DURATION)
+    else:
+      self.in_combat = np.zeros(self.num_agents, dtype=bool)
+
+    if inventory is not None:
+      self.in_inventory = self._item_attr(inventory, "id") != 0
+      self.inventory_len = self.in_inventory.sum(axis=1)
+      # no masks on the inventory of agents in combat
+      self.can_trade = (self.inventory_len > 0) & ~self.in_combat & self.has_self
+
+  def _agent_attr(self, name):
+    return self.agent[:, EntityState.State.attr_name_to_col[name]]
+
+  def _entity_attr(self, name):
+    return self.entities[:, :, EntityState.State.attr_name_to_col[name]]
+
+  @staticmethod
+  def _item_attr(items, name):
+    return items[..., ItemState.State.attr_name_to_col[name]]
+
+  def _ones(self, num):
+    return np.ones((self.num_agents, num), dtype=np.int8)
+
+  def masks(self):
+    masks = {}
+    masks[action.Move] = {
+      action.Direction: self._make_move_mask()
+    }
+
+    if self.config.COMBAT_SYSTEM_ENABLED:
+      masks[action.Attack] = {
+        action.Style: self._ones(len(action.Style.edges)),
+        action.Target: self._make_attack_mask()
+      }
+
+    if self.config.ITEM_SYSTEM_ENABLED:
+      masks[action.Use] = {
+        action.InventoryItem: self._make_use_mask()
+      }
+      masks[action.Give] = {
+        action.InventoryItem: self._make_sell_mask(),
+        action.Target: self._make_give_target_mask()
+      }
+      masks[action.Destroy] = {
+        action.InventoryItem: self._make_destroy_item_mask()
+      }
+
+    if self.config.EXCHANGE_SYSTEM_ENABLED:
+      masks[action.Sell] = {
+        action.InventoryItem: self._make_sell_mask(),
+        action.Price: self._ones(len(action.Price.edges))
+      }
+      masks[action.Buy] = {
+        action.MarketItem: self._make_buy_mask()
+      }
+      masks[action.GiveGold] = {
+        action.Target: self._make_give_target_mask(),
+        action.Price: self._make_give_gold_mask() # reusing Price
+      }
+
+    if self.config.COMMUNICATION_SYSTEM_ENABLED:
+      masks[action.Comm] = {
+        action.Token: self._ones(len(action.Token.edges))
+      }
+
+    return masks
+
+  def _make_move_mask(self):
+    if self.config.TILE_OBS_FORMAT != "list":
+      return self._make_grid_move_mask()
+
+    row, col = self._agent_attr("row"), self._agent_attr("col")
+    tile_row = self.tiles[:, :, TileState.State.attr_name_to_col["row"]]
+    tile_col = self.tiles[:, :, TileState.State.attr_name_to_col["col"]]
+    tile_material = self.tiles[:, :, TileState.State.attr_name_to_col["material_id"]]
+    habitable = np.array(sorted(material.Habitable.indices))
+    agents = np.arange(self.num_agents)
+    # full windows are row-major around the agent
+    diameter = self.config.PLAYER_VISION_DIAMETER
+    center = self.config.MAP_N_OBS // 2
+
+    mask = np.zeros((self.num_agents, len(action.Direction.edges)), dtype=np.int8)
+    # pylint: disable=not-an-iterable
+    for idx, direction in enumerate(action.Direction.edges):
+      r, c = row + direction.delta[0], col + direction.delta[1]
+      tile = np.full(self.num_agents, center + direction.delta[0] * diameter + direction.delta[1])
+      found = (tile_row[agents, tile] == r) & (tile_col[agents, tile] == c)
+
+      # windows clipped by the map edge are searched. The padding rows
+      # come after the visible tiles, so the first match is the tile
+      clipped = np.nonzero(~found)[0]
+      if len(clipped) > 0:
+        match = (tile_row[clipped] == r[clipped, None]) & (tile_col[clipped] == c[clipped, None])
+        tile[clipped] = match.argmax(axis=1)
+        found[clipped] = match.any(axis=1)
+
+      # tiles outside the map are lava
+      in_map = (0 <= r) & (r < self.config.MAP_SIZE) & (0 <= c) & (c < self.config.MAP_SIZE)
+      mask[:, idx] = in_map & found & np.isin(tile_material[agents, tile], habitable)
+    return mask & self.has_self[:, None]
+
+  def _make_grid_move_mask(self):
+    # egocentric tensors, where tiles outside the map are lava
+    if self.config.TILE_OBS_FORMAT == "grid":
+      grids = self.tiles[..., 0]
+    else:
+      grids = self.tiles.argmax(axis=-1)
+    radius = self.config.PLAYER_VISION_RADIUS
+    habitable = np.array(sorted(material.Habitable.indices))
+    # pylint: disable=not-an-iterable
+    return (np.stack(
+      [np.isin(grids[:, radius + d.delta[0], radius + d.delta[1]], habitable)
+       for d in action.Direction.edges], axis=1) & self.has_self[:, None]).astype(np.int8)
+
+  def _make_attack_mask(self):
+    assert self.config.COMBAT_MELEE_REACH == self.config.COMBAT_RANGE_REACH
+    assert self.config.COMBAT_MELEE_REACH == self.config.COMBAT_MAGE_REACH
+    attack_range = self.config.COMBAT_MELEE_REACH
+
+    distance = np.maximum(
+      np.abs(self._entity_attr("row") - self._agent_attr("row")[:, None]),
+      np.abs(self._entity_attr("col") - self._agent_attr("col")[:, None]))
+    within_range = distance <= attack_range
+
+    immunity = self.config.COMBAT_SPAWN_IMMUNITY
+    spawn_immunity = np.where(
+      ((0 < immunity) & (immunity < self._agent_attr("time_alive")))[:, None],
+      # ids > 0 equals entity.is_player
+      (self._entity_attr("id") > 0) & (self._entity_attr("time_alive") < immunity),
+      True)
+
+    # allow friendly fire but no self shooting
+    return (self.visible & within_range & spawn_immunity & ~self.is_me
+            & self.has_self[:, None]).astype(np.int8)
+
+  def _make_use_mask(self):
+    # level limits are differently applied depending on item types
+    item_type = self._item_attr(self.inventory, "type_id").astype(np.int64)
+    skill_level = np.full((self.num_agents, item_type.max(initial=0) + 1), -np.inf)
+    level = np.maximum(1, np.max([self._agent_attr(skill) for skill in SKILL_LEVELS], axis=0))
+    for item, skill in ITEM_SKILL.items():
+      if item.ITEM_TYPE_ID < skill_level.shape[1]:
+        skill_level[:, item.ITEM_TYPE_ID] = level if skill is None else self._agent_attr(skill)
+    level_satisfied = self._item_attr(self.inventory, "level") <= \
+      np.take_along_axis(skill_level, item_type, axis=1)
+
+    not_listed = self._item_attr(self.inventory, "listed_price") == 0
+    return (self.can_trade[:, None] & self.in_inventory & not_listed
+            & level_satisfied).astype(np.int8)
+
+  def _make_destroy_item_mask(self):
+    # not equipped items in the inventory can be destroyed
+    not_equipped = self._item_attr(self.inventory, "equipped") == 0
+    return (self.can_trade[:, None] & self.in_inventory & not_equipped).astype(np.int8)
+
+  def _make_give_target_mask(self):
+    same_tile = (self._entity_attr("row") == self._agent_attr("row")[:, None]) & \
+      (self._entity_attr("col") == self._agent_attr("col")[:, None])
+    player = self._entity_attr("npc_type") == 0
+    return (self.can_trade[:, None] & self.visible & same_tile & player
+            & ~self.is_me).astype(np.int8)
+
+  def _make_give_gold_mask(self):
+    # NOTE that action.Price starts from Discrete_1
+    mask = np.arange(self.config.PRICE_N_OBS) < self.gold[:, None]
+    return (mask & ~self.in_combat[:, None]).astype(np.int8)
+
+  def _make_sell_mask(self):
+    if not self.config.EXCHANGE_SYSTEM_ENABLED:
+      return np.zeros((self.num_agents, self.config.INVENTORY_N_OBS), dtype=np.int8)
+
+    not_equipped = self._item_attr(self.inventory, "equipped") == 0
+    not_listed = self._item_attr(self.inventory, "listed_price") == 0
+    return (self.can_trade[:, None] & self.in_inventory & not_equipped
+            & not_listed).astype(np.int8)
+
+  def _make_buy_mask(self):
+    listed = self._item_attr(self.market, "id") != 0
+    enough_gold = self._item_attr(self.market, "listed_price") <= self.gold[:, None]
+    not_mine = self._item_attr(self.market, "owner_id") != self.agent_ids[:, None]
+    mask = listed & enough_gold & not_mine & (~self.in_combat & self.has_self)[:, None]
+
+    # if the inventory is full, one can only buy existing ammo stack
+    full = np.nonzero(self.inventory_len >= self.config.ITEM_INVENTORY_CAPACITY)[0]
+    if len(full) > 0:
+      mask[full] &= self._existing_ammo_listings(full)
+    return mask.astype(np.int8)
+
+  def _existing_ammo_listings(self, agents):
+    inventory = self.inventory[agents]
+    ammo = np.isin(self._item_attr(inventory, "type_id"),
+                   [item.ITEM_TYPE_ID for item in AMMO])
+    ammo &= self.in_inventory[agents]
+
+    # market items with the same type and level as an ammo stack in the inventory
+    same_type = self._item_attr(self.market, "type_id")[:, None] == \
+      self._item_attr(inventory, "type_id")[:, None, :]
+    same_level = self._item_attr(self.market, "level")[:, None] == \
+      self._item_attr(inventory, "level")[:, None, :]
+    return np.any(same_type & same_level & ammo[:, None, :], axis=2)
+
+
 class Observation:
   def __init__(self,
     config,
@@ -45,12 +484,22 @@ class Observation:
     tiles,
     entities,
     inventory,
-    market) -> None:
+    market,
+    market_obs=None,
+    tile_grid=None,
+    tile_obs=None) -> None:
 
     self.config = config
     self.current_tick = current_tick
     self.agent_id = agent_id
 
+    # Memoized per instance, so that they are freed with the observation
+    self._entity_cache = {}
+    self._tile_cache = {}
+    # tile_grid and tile_obs may come from a batched extraction
+    self._tile_grid = tile_grid
+    self._tile_obs = tile_obs
+
     self.tiles = tiles[0:config.MAP_N_OBS]
     self.entities = BasicObs(entities[0:config.PLAYER_N_OBS],
                               EntityState.State.attr_name_to_col["id"])
@@ -71,11 +520,44 @@ class Observation:
     if config.EXCHANGE_SYSTEM_ENABLED:
       self.market = BasicObs(market[0:config.MARKET_N_OBS],
                              ItemState.State.attr_name_to_col["id"])
+      # the padded market from shared_market(), if the caller made it
+      self.market_obs = market_obs
     else:
       assert market.size == 0
 
-  # pylint: disable=method-cache-max-size-none
-  @lru_cache(maxsize=None)
+  @property
+  def tile_grid(self):
+    '''Materials of the visible tiles as a (2r+1, 2r+1) grid centered on
+    the agent, with r the vision radius. Cells outside the map are lava'''
+    if self._tile_grid is None:
+      radius = self.config.PLAYER_VISION_RADIUS
+      agent = self.agent()
+      grid = np.full((2*radius + 1, 2*radius + 1), material.Lava.index, dtype=np.int16)
+      rows = self.tiles[:, TileState.State.attr_name_to_col["row"]].astype(np.int64)
+      cols = self.tiles[:, TileState.State.attr_name_to_col["col"]].astype(np.int64)
+      grid[rows - int(agent.row) + radius, cols - int(agent.col) + radius] = \
+        self.tiles[:, TileState.State.attr_name_to_col["material_id"]]
+      self._tile_grid = grid
+    return self._tile_grid
+
+  def tile_obs(self):
+    '''The Tile observation in the config's TILE_OBS_FORMAT, unpadded'''
+    if self.config.TILE_OBS_FORMAT == "list":
+      return self.tiles
+    if self._tile_obs is None:
+      self._tile_obs = tile_tensor(self.config, self.tile_grid)
+    return self._tile_obs
+
+  def tile_materials(self, r_delta, c_delta):
+    '''Vectorized tile(): the materials at arrays of offsets from the
+    agent. Offsets beyond the vision radius are lava'''
+    radius = self.config.PLAYER_VISION_RADIUS
+    r_delta, c_delta = np.asarray(r_delta), np.asarray(c_delta)
+    in_sight = (np.abs(r_delta) <= radius) & (np.abs(c_delta) <= radius)
+    materials = self.tile_grid[np.where(in_sight, r_delta + radius, 0),
+                               np.where(in_sight, c_delta + radius, 0)]
+    return np.where(in_sight, materials, material.Lava.index)
+
   def tile(self, r_delta, c_delta):
     '''Return the array object corresponding to a nearby tile
 
@@ -86,116 +568,146 @@ class Observation:
     Returns:
         Vector corresponding to the specified tile
     '''
+    tile = self._tile_cache.get((r_delta, c_delta))
+    if tile is not None:
+      return tile
+
     agent = self.agent()
-    if (0 <= agent.row + r_delta < self.config.MAP_SIZE) & \
-       (0 <= agent.col + c_delta < self.config.MAP_SIZE):
-      r_cond = (self.tiles[:,TileState.State.attr_name_to_col["row"]] == agent.row + r_delta)
-      c_cond = (self.tiles[:,TileState.State.attr_name_to_col["col"]] == agent.col + c_delta)
-      return TileState.parse_array(self.tiles[r_cond & c_cond][0])
+    radius = self.config.PLAYER_VISION_RADIUS
+    row, col = int(agent.row) + r_delta, int(agent.col) + c_delta
+    if (0 <= row < self.config.MAP_SIZE) and (0 <= col < self.config.MAP_SIZE) and \
+       abs(r_delta) <= radius and abs(c_delta) <= radius:
+      tile = SimpleNamespace(
+        row=row, col=col,
+        material_id=int(self.tile_grid[r_delta + radius, c_delta + radius]))
+    else:
+      # return a dummy lava tile at (inf, inf)
+      tile = SimpleNamespace(row=np.inf, col=np.inf, material_id=material.Lava.index)
 
-    # return a dummy lava tile at (inf, inf)
-    return TileState.parse_array([np.inf, np.inf, material.Lava.index])
+    self._tile_cache[(r_delta, c_delta)] = tile
+    return tile
 
-  # pylint: disable=method-cache-max-size-none
-  @lru_cache(maxsize=None)
   def entity(self, entity_id):
-    rows = self.entities.values[self.entities.ids == entity_id]
-    if rows.size == 0:
-      return None
-    return EntityState.parse_array(rows[0])
+    if entity_id not in self._entity_cache:
+      rows = self.entities.values[self.entities.ids == entity_id]
+      self._entity_cache[entity_id] = \
+        EntityState.parse_array(rows[0]) if rows.size else None
+    return self._entity_cache[entity_id]
 
-  # pylint: disable=method-cache-max-size-none
-  @lru_cache(maxsize=None)
   def agent(self):
     return self.entity(self.agent_id)
 
-  def to_gym(self):
-    '''Convert the observation to a format that can be used by OpenAI Gym'''
+  def to_gym(self, buffers=None, action_targets=True, lazy=False):
+    '''Convert the observation to a format that can be used by OpenAI Gym
+
+    With ObservationBuffers, the arrays are written into the agent's
+    slot of the buffers, and the returned dict holds views of them.
+    action_targets=False leaves the masks out, for callers that make
+    them for all agents at once with make_action_targets(). lazy=True
+    returns a LazyObs, which computes each key and mask on first access'''
+
+    def pad(key, values, num_rows):
+      if buffers is not None:
+        return lambda: buffers.write(key, self.agent_id, values)
+      return lambda: np.vstack(
+        [values, np.zeros((num_rows - values.shape[0], values.shape[1]))])
 
     gym_obs = {
-      "CurrentTick": np.array([self.current_tick]),
-      "AgentId": np.array([self.agent_id]),
-      "Tile": np.vstack([
-        self.tiles,
-        np.zeros((self.config.MAP_N_OBS - self.tiles.shape[0], self.tiles.shape[1]))
-      ]),
-      "Entity": np.vstack([
-        self.entities.values, np.zeros((
-          self.config.PLAYER_N_OBS - self.entities.values.shape[0],
-          self.entities.values.shape[1]))
-      ])
+      "CurrentTick": lambda: np.array([self.current_tick]),
+      "AgentId": lambda: np.array([self.agent_id]),
+      "Tile": pad("Tile", self.tiles, self.config.MAP_N_OBS),
+      "Entity": pad("Entity", self.entities.values, self.config.PLAYER_N_OBS),
     }
 
+    if self.config.TILE_OBS_FORMAT != "list":
+      # fixed-shape tensors, which need no padding
+      if buffers is not None:
+        gym_obs["Tile"] = lambda: buffers.write("Tile", self.agent_id, self.tile_obs())
+      else:
+        gym_obs["Tile"] = self.tile_obs
+
     if self.config.ITEM_SYSTEM_ENABLED:
-      gym_obs["Inventory"] = np.vstack([
-        self.inventory.values, np.zeros((
-          self.config.INVENTORY_N_OBS - self.inventory.values.shape[0],
-          self.inventory.values.shape[1]))
-      ])
+      gym_obs["Inventory"] = pad(
+        "Inventory", self.inventory.values, self.config.INVENTORY_N_OBS)
 
     if self.config.EXCHANGE_SYSTEM_ENABLED:
-      gym_obs["Market"] = np.vstack([
-        self.market.values, np.zeros((
-          self.config.MARKET_N_OBS - self.market.values.shape[0],
-          self.market.values.shape[1]))
-      ])
-
-    if self.config.PROVIDE_ACTION_TARGETS:
+      if self.market_obs is not None:
+        gym_obs["Market"] = lambda: self.market_obs
+      else:
+        gym_obs["Market"] = pad("Market", self.market.values, self.config.MARKET_N_OBS)
+
+    if lazy:
+      if self.config.PROVIDE_ACTION_TARGETS and action_targets:
+        masks = LazyObs({atn: functools.partial(LazyObs, args)
+                         for atn, args in self._action_target_makers().items()})
+        gym_obs["ActionTargets"] = lambda: masks
+      return LazyObs(gym_obs)
+
+    gym_obs = {key: make() for key, make in gym_obs.items()}
+    if self.config.PROVIDE_ACTION_TARGETS and action_targets:
       gym_obs["ActionTargets"] = self._make_action_targets()
 
     return gym_obs
 
   def _make_action_targets(self):
+    return {atn: {arg: make() for arg, make in args.items()}
+            for atn, args in self._action_target_makers().items()}
+
+  def _action_target_makers(self):
+    '''The functions that make each mask, as {action: {argument: function}}'''
     # TODO(kywch): return all-0 masks for buy/sell/give during combat
 
+    def ones(num):
+      return functools.partial(np.ones, num, dtype=np.int8)
+
     masks = {}
     masks[action.Move] = {
-      action.Direction: self._make_move_mask()
+      action.Direction: self._make_move_mask
     }
 
     if self.config.COMBAT_SYSTEM_ENABLED:
       masks[action.Attack] = {
-        action.Style: np.ones(len(action.Style.edges), dtype=np.int8),
-        action.Target: self._make_attack_mask()
+        action.Style: ones(len(action.Style.edges)),
+        action.Target: self._make_attack_mask
       }
 
     if self.config.ITEM_SYSTEM_ENABLED:
       masks[action.Use] = {
-        action.InventoryItem: self._make_use_mask()
+        action.InventoryItem: self._make_use_mask
       }
       masks[action.Give] = {
-        action.InventoryItem: self._make_sell_mask(),
-        action.Target: self._make_give_target_mask()
+        action.InventoryItem: self._make_sell_mask,
+        action.Target: self._make_give_target_mask
       }
       masks[action.Destroy] = {
-        action.InventoryItem: self._make_destroy_item_mask()
+        action.InventoryItem: self._make_destroy_item_mask
       }
 
     if self.config.EXCHANGE_SYSTEM_ENABLED:
       masks[action.Sell] = {
-        action.InventoryItem: self._make_sell_mask(),
-        action.Price: np.ones(len(action.Price.edges), dtype=np.int8)
+        action.InventoryItem: self._make_sell_mask,
+        action.Price: ones(len(action.Price.edges))
       }
       masks[action.Buy] = {
-        action.MarketItem: self._make_buy_mask()
+        action.MarketItem: self._make_buy_mask
       }
       masks[action.GiveGold] = {
-        action.Target: self._make_give_target_mask(),
-        action.Price: self._make_give_gold_mask() # reusing Price
+        action.Target: self._make_give_target_mask,
+        action.Price: self._make_give_gold_mask # reusing Price
       }
 
     if self.config.COMMUNICATION_SYSTEM_ENABLED:
       masks[action.Comm] = {
-        action.Token: np.ones(len(action.Token.edges), dtype=np.int8)
+        action.Token: ones(len(action.Token.edges))
       }
 
     return masks
 
   def _make_move_mask(self):
     # pylint: disable=not-an-iterable
-    return np.array(
-      [self.tile(*d.delta).material_id in material.Habitable
-       for d in action.Direction.edges], dtype=np.int8)
+    r_delta, c_delta = zip(*(d.delta for d in action.Direction.edges))
+    return np.isin(self.tile_materials(r_delta, c_delta),
+                   list(material.Habitable.indices)).astype(np.int8)
 
   def _make_attack_mask(self):
     # NOTE: Currently, all attacks have the same range
@@ -252,27 +764,9 @@ class Observation:
     agent = self.agent()
 
     # the minimum agent level is 1
-    level = max(1, agent.melee_level, agent.range_level, agent.mage_level,
-                agent.fishing_level, agent.herbalism_level, agent.prospecting_level,
-                agent.carving_level, agent.alchemy_level)
-    return {
-      item_system.Hat.ITEM_TYPE_ID: level,
-      item_system.Top.ITEM_TYPE_ID: level,
-      item_system.Bottom.ITEM_TYPE_ID: level,
-      item_system.Sword.ITEM_TYPE_ID: agent.melee_level,
-      item_system.Bow.ITEM_TYPE_ID: agent.range_level,
-      item_system.Wand.ITEM_TYPE_ID: agent.mage_level,
-      item_system.Rod.ITEM_TYPE_ID: agent.fishing_level,
-      item_system.Gloves.ITEM_TYPE_ID: agent.herbalism_level,
-      item_system.Pickaxe.ITEM_TYPE_ID: agent.prospecting_level,
-      item_system.Chisel.ITEM_TYPE_ID: agent.carving_level,
-      item_system.Arcane.ITEM_TYPE_ID: agent.alchemy_level,
-      item_system.Scrap.ITEM_TYPE_ID: agent.melee_level,
-      item_system.Shaving.ITEM_TYPE_ID: agent.range_level,
-      item_system.Shard.ITEM_TYPE_ID: agent.mage_level,
-      item_system.Ration.ITEM_TYPE_ID: level,
-      item_system.Poultice.ITEM_TYPE_ID: level
-    }
+    level = max(1, *(getattr(agent, skill) for skill in SKILL_LEVELS))
+    return {item.ITEM_TYPE_ID: level if skill is None else getattr(agent, skill)
+            for item, skill in ITEM_SKILL.items()}
 
   def _make_destroy_item_mask(self):
     # empty inventory -- nothing to destroy
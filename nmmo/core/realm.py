@@ -41,9 +41,21 @@ class Realm:
     # Generate maps if they do not exist
     config.MAP_GENERATOR(config).generate_all_maps()
 
-    self.datastore = NumpyDatastore()
+    if config.DATASTORE_SHARED_MEMORY:
+      from nmmo.datastore.shared_memory_datastore import SharedMemoryDatastore
+      self.datastore = SharedMemoryDatastore()
+    else:
+      self.datastore = NumpyDatastore()
     for s in [TileState, EntityState, ItemState, EventState]:
-      self.datastore.register_object_type(s._name, s.State.num_attributes)
+      self.datastore.register_object_type(
+        s._name, s.State.num_attributes, s.State.indexes, s.State.dtypes,
+        s.Capacity(config))
+
+    # Bucket entities on a grid so that window queries only touch the
+    # rows near the observer. Tiles get a grid index once the map is loaded
+    EntityState.State.table(self.datastore).add_spatial_index(
+      EntityState.State.attr_name_to_col["row"], EntityState.State.attr_name_to_col["col"],
+      config.PLAYER_VISION_RADIUS + 1)
 
     self.tick = None # to use as a "reset" checker
     self.exchange = None
@@ -51,6 +63,12 @@ class Realm:
     # Load the world file
     self.map = Map(config, self)
 
+    # Tiles are created in row-major order and never move, so the tile
+    # windows of all agents can be sliced out of the table at once
+    TileState.State.table(self.datastore).add_grid_index(
+      TileState.State.attr_name_to_col["row"], TileState.State.attr_name_to_col["col"],
+      config.MAP_SIZE)
+
     self.log_helper = LogHelper.create(self)
     self.event_log = EventLogger(self)
 
@@ -73,6 +91,8 @@ class Realm:
     Args:
         idx: Map index to load
     """
+    # Changes to the tables are stamped with the tick they happen in
+    self.datastore.begin_tick(0)
     self.log_helper.reset()
     self.event_log.reset()
     self._replay_helper.reset()
@@ -83,7 +103,7 @@ class Realm:
     self.npcs.reset()
 
     # TODO: track down entity/item leaks
-    EntityState.State.table(self.datastore).reset()
+    EntityState.State.table(self.datastore).reset(self.config.DATASTORE_SHRINK_ON_RESET)
     assert EntityState.State.table(self.datastore).is_empty(), \
         "EntityState table is not empty"
 
@@ -91,7 +111,7 @@ class Realm:
     #   but should be. Will fix this while debugging the item system.
     # assert ItemState.State.table(self.datastore).is_empty(), \
     #     "ItemState table is not empty"
-    ItemState.State.table(self.datastore).reset()
+    ItemState.State.table(self.datastore).reset(self.config.DATASTORE_SHRINK_ON_RESET)
 
     self.players.spawn()
     self.npcs.spawn()
@@ -145,6 +165,8 @@ class Realm:
     Returns:
         dead: List of dead agents
     """
+    self.datastore.begin_tick(self.tick + 1)
+
     # Prioritize actions
     npc_actions = self.npcs.actions(self)
     merged = defaultdict(list)
@@ -0,0 +1,143 @@
+import gc
+import io
+import pickle
+import random
+import sys
+import types
+
+import numpy as np
+
+from nmmo.systems.item import Item
+
+"""
+Snapshots of a running environment, for branching rollouts: take one
+with Env.snapshot(), and Env.restore() rewinds the env to it as many
+times as needed.
+
+The datastore tables are copied as arrays. The rest of the state
+(entities, items, the exchange, tasks, observations...) is pickled
+once, and unpickled on every restore. Objects that live as long as the
+env (the config, the realm, the map and its tiles, the tables) are
+pickled by reference, so the restored entities point at the live ones.
+Of the tiles, only the ones that were depleted or occupied are saved.
+"""
+
+# Realm and Env attributes that change during a rollout
+REALM_STATE = ['tick', 'exchange', 'log_helper', 'event_log',
+               'players', 'npcs', 'items', '_replay_helper']
+ENV_STATE = ['obs', '_dead_agents', 'scripted_agents',
+             '_gamestate_generator', 'tasks']
+
+def _shared_object(key):
+  raise pickle.UnpicklingError(f'Shared object {key} loaded outside of a snapshot')
+
+def _importable(obj) -> bool:
+  found = sys.modules.get(obj.__module__)
+  for name in obj.__qualname__.split('.'):
+    found = getattr(found, name, None)
+  return found is obj
+
+class _Pickler(pickle.Pickler):
+  def __init__(self, file, shared):
+    super().__init__(file, pickle.HIGHEST_PROTOCOL)
+    self.shared = shared
+
+  def reducer_override(self, obj):
+    # Unlike persistent_id(), this is not called for the builtin containers
+    if id(obj) in self.shared:
+      return _shared_object, (id(obj),)
+    if isinstance(obj, (type, types.FunctionType)) and not _importable(obj):
+      # Generated classes and lambdas are shared, as deepcopy would do
+      self.shared[id(obj)] = obj
+      return _shared_object, (id(obj),)
+    return NotImplemented
+
+class _Unpickler(pickle.Unpickler):
+  def __init__(self, file, shared):
+    super().__init__(file)
+    self.shared = shared
+
+  def find_class(self, module, name):
+    if module == __name__ and name == '_shared_object':
+      return self.shared.__getitem__
+    return super().find_class(module, name)
+
+def _occupied_tiles(realm):
+  tiles = realm.map.tiles
+  return {tiles[ent.pos] for group in (realm.players, realm.npcs)
+          for ent in group.entities.values()}
+
+class EnvSnapshot:
+  '''State of an Env at one tick, see Env.snapshot()'''
+  def __init__(self, env):
+    realm = env.realm
+    realm.datastore.flush()
+    self.tick = realm.tick
+    self._env = env
+    self.map_id = realm.map.map_id
+    self.tables = realm.datastore.snapshot()
+    self.random_state = (np.random.get_state(), random.getstate(), Item.INSTANCE_ID)
+
+    # Tiles that differ from a freshly loaded map. A tile's state is
+    # usually its material, which is kept as is
+    tiles = [(tile, None if tile.state is tile.material else tile.state,
+              tile.depleted, tile.entities)
+             for tile in realm.map.update_list | _occupied_tiles(realm)]
+
+    # The game state is recomputed every step and never changed, so it is shared
+    self._game_state = env.game_state
+    self._shared = {id(obj): obj for obj in [
+      env, env.config, env.game_state, realm, realm.map, realm.datastore]}
+    for table in realm.datastore._tables.values(): # pylint: disable=protected-access
+      self._shared[id(table)] = table
+    for tile in realm.map.tiles.flat:
+      self._shared[id(tile)] = tile
+
+    buffer = io.BytesIO()
+    _Pickler(buffer, self._shared).dump((
+      {attr: getattr(realm, attr) for attr in REALM_STATE},
+      {attr: getattr(env, attr) for attr in ENV_STATE},
+      realm.map.update_list, tiles))
+    self._state = buffer.getvalue()
+
+  def restore(self, env):
+    assert env is self._env, 'The snapshot was taken from another environment'
+    realm = env.realm
+
+    if realm.map.map_id != self.map_id:
+      # The env was reset to another map since
+      realm.map.reset(self.map_id)
+    else:
+      for tile in realm.map.update_list | _occupied_tiles(realm):
+        tile.state = tile.material
+        tile.depleted = False
+        tile.entities = {}
+
+    # Every row counts as changed by the restore
+    realm.datastore.begin_tick(self.tick)
+    realm.datastore.restore(self.tables)
+    # Loading creates many objects at once, which would trigger full
+    # collections of the heap for nothing
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+      realm_state, env_state, update_list, tiles = \
+        _Unpickler(io.BytesIO(self._state), self._shared).load()
+    finally:
+      if gc_enabled:
+        gc.enable()
+    for attr, val in realm_state.items():
+      setattr(realm, attr, val)
+    for attr, val in env_state.items():
+      setattr(env, attr, val)
+    env.game_state = self._game_state
+
+    realm.map.update_list = update_list
+    for tile, state, depleted, entities in tiles:
+      tile.state = tile.material if state is None else state
+      tile.depleted = depleted
+      tile.entities = entities
+
+    np_state, py_state, Item.INSTANCE_ID = self.random_state
+    np.random.set_state(np_state)
+    random.setstate(py_state)
@@ -4,12 +4,12 @@ import random
 import logging
 
 import numpy as np
-import vec_noise
-from imageio.v2 import imread, imsave
-from scipy import stats
 
 from nmmo import material
 
+# vec_noise, imageio and scipy are imported by the functions that use
+#   them, so that envs that load their maps do not pay for them
+
 
 def sharp(noise):
   '''Exponential noise sharpener for perlin ridges'''
@@ -20,6 +20,7 @@ class Save:
   @staticmethod
   def render(mats, lookup, path):
     '''Render tiles to png'''
+    from imageio.v2 import imsave
     images = [[lookup[e] for e in l] for l in mats]
     image = np.vstack([np.hstack(e) for e in images])
     imsave(path, image)
@@ -27,6 +28,7 @@ class Save:
   @staticmethod
   def fractal(terrain, path):
     '''Render raw noise fractal to png'''
+    from imageio.v2 import imsave
     frac = (256*terrain).astype(np.uint8)
     imsave(path, frac)
 
@@ -39,9 +41,12 @@ class Save:
 # pylint: disable=E1101:no-member
 # Terrain uses setattr()
 class Terrain:
-  '''Terrain material class; populated at runtime'''
+  '''Terrain material class; populated after its definition'''
   @staticmethod
   def generate_terrain(config, map_id, interpolaters):
+    import vec_noise
+    from scipy import stats
+
     center      = config.MAP_CENTER
     border      = config.MAP_BORDER
     size        = config.MAP_SIZE
@@ -207,24 +212,33 @@ def spawn_profession_resources(config, tiles):
     uniform(config, tiles, Terrain.HERB, mmin, mmax)
     place_fish(tiles)
 
+for _mat in material.All:
+  setattr(Terrain, _mat.tex.upper(), _mat.index)
+
 class MapGenerator:
   '''Procedural map generation'''
   def __init__(self, config):
     self.config = config
-    self.load_textures()
     self.interpolaters = None
+    self._textures = None
+
+  @property
+  def textures(self):
+    '''Tile pngs by material index, loaded on first use'''
+    if self._textures is None:
+      self.load_textures()
+    return self._textures
 
   def load_textures(self):
-    '''Called during setup; loads and resizes tile pngs'''
+    '''Loads and resizes tile pngs, for the map previews'''
+    from imageio.v2 import imread
     lookup = {}
     path   = self.config.PATH_TILE
     scale  = self.config.MAP_PREVIEW_DOWNSCALE
     for mat in material.All:
-      key = mat.tex
-      tex = imread(path.format(key))
+      tex = imread(path.format(mat.tex))
       lookup[mat.index] = tex[:, :, :3][::scale, ::scale]
-      setattr(Terrain, key.upper(), mat.index)
-    self.textures = lookup
+    self._textures = lookup
 
   def generate_all_maps(self):
     '''Generates NMAPS maps according to generate_map
@@ -10,7 +10,11 @@ TileState = SerializedState.subclass(
     "row",
     "col",
     "material_id",
-  ])
+  ], dtypes={
+    "row": np.int16,
+    "col": np.int16,
+    "material_id": np.int16,
+  })
 
 TileState.Limits = lambda config: {
   "row": (0, config.MAP_SIZE-1),
@@ -18,21 +22,43 @@ TileState.Limits = lambda config: {
   "material_id": (0, config.MAP_N_TILE),
 }
 
+# Every map cell has a row, and row 0 is reserved
+TileState.Capacity = lambda config: config.MAP_SIZE ** 2 + 1
+
 TileState.Query = SimpleNamespace(
   window=lambda ds, r, c, radius: ds.table("Tile").window(
     TileState.State.attr_name_to_col["row"],
     TileState.State.attr_name_to_col["col"],
     r, c, radius),
+  windows=lambda ds, rows, cols, radius: ds.table("Tile").windows(
+    TileState.State.attr_name_to_col["row"],
+    TileState.State.attr_name_to_col["col"],
+    rows, cols, radius),
+  # (len(rows), 2*radius+1, 2*radius+1) materials, lava outside the map
+  material_grids=lambda ds, rows, cols, radius: ds.table("Tile").grid_windows(
+    TileState.State.attr_name_to_col["row"],
+    TileState.State.attr_name_to_col["col"],
+    TileState.State.attr_name_to_col["material_id"],
+    rows, cols, radius, material.Lava.index),
 )
 
+_ROW = TileState.State.attr_name_to_col["row"]
+_COL = TileState.State.attr_name_to_col["col"]
+_MATERIAL_ID = TileState.State.attr_name_to_col["material_id"]
+
 class Tile(TileState):
+  # There is one Tile per map cell, so keep them small. For the same
+  # reason, the hot paths below write the record directly instead of
+  # building attribute views, which slotted records do not keep
+  __slots__ = ('realm', 'config', 'state', 'material', 'depleted', 'tex', 'entities')
+
   def __init__(self, realm, r, c):
     super().__init__(realm.datastore, TileState.Limits(realm.config))
     self.realm = realm
     self.config = realm.config
 
-    self.row.update(r)
-    self.col.update(c)
+    self._update(_ROW, r)
+    self._update(_COL, c)
 
     self.state = None
     self.material = None
@@ -41,13 +67,19 @@ class Tile(TileState):
 
     self.entities = {}
 
+  def _update(self, col, value):
+    # Values are within the limits: positions are on the map, and
+    # materials are indexed below MAP_N_TILE
+    self._vals[col] = value
+    self.datastore_record.update(col, value)
+
   @property
   def repr(self):
-    return ((self.row.val, self.col.val))
+    return self.pos
 
   @property
   def pos(self):
-    return self.row.val, self.col.val
+    return self._vals[_ROW], self._vals[_COL]
 
   @property
   def habitable(self):
@@ -64,7 +96,7 @@ class Tile(TileState):
   def reset(self, mat, config):
     self.state = mat(config)
     self.material = mat(config)
-    self.material_id.update(self.state.index)
+    self._update(_MATERIAL_ID, self.state.index)
 
     self.depleted = False
     self.tex = self.material.tex
@@ -85,7 +117,7 @@ class Tile(TileState):
 
     self.depleted = False
     self.state = self.material
-    self.material_id.update(self.state.index)
+    self._update(_MATERIAL_ID, self.state.index)
 
   def harvest(self, deplete):
     assert not self.depleted, f'{self.state} is depleted'
@@ -94,6 +126,6 @@ class Tile(TileState):
     if deplete:
       self.depleted = True
       self.state = self.material.deplete(self.config)
-      self.material_id.update(self.state.index)
+      self._update(_MATERIAL_ID, self.state.index)
 
     return self.material.harvest()
@@ -0,0 +1,241 @@
+import copy
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import nmmo
+from nmmo.core.batched_env import BatchedEnv
+from nmmo.io import action
+
+"""
+Steps several BatchedEnvs in worker processes. Observations, rewards,
+dones and actions live in one shared memory block, and only a short
+command crosses the pipe of each worker per step:
+
+  vec = VecEnv(config, num_envs=4, seed=1)
+  obs = vec.reset()
+  obs["Tile"]       # float32 array of (num_envs, num_agents, MAP_N_OBS, attributes)
+  obs["Market"]     # (num_envs, MARKET_N_OBS, attributes), shared by the agents
+  vec.actions[:] = policy(obs)
+  obs, rewards, dones = vec.step()
+  rewards, dones    # float32 and bool arrays of (num_envs, num_agents)
+
+vec.actions is an int32 array of (num_envs, num_agents, len(vec.columns)),
+which each worker passes to Env.step() as array actions: one column
+per (action, argument) in the order of action_space(), with values that
+index the Discrete spaces as the ActionTargets masks do. An action with
+any negative argument is not taken, so actions.fill(-1) is a no-op.
+
+step() is step_async() followed by step_wait(), and the learner can
+work in between, while the envs step. It must not write vec.actions
+until step_wait() returns.
+
+With auto_reset, an env whose agents are all done resets on its own,
+right after returning that last step, so that the reset overlaps the
+learner's work. The next step of that env ignores its actions and
+returns the first observations of the new episode, with zero rewards.
+
+As with BatchedEnv, the arrays are refilled in place every step, copy
+them to keep them.
+"""
+
+class _Layout:
+  '''The arrays of all envs in one shared memory block'''
+  def __init__(self, config, num_envs, num_agents, observation_space):
+    self.specs = {}
+    for key in ["Tile", "Entity", "Inventory", "Task"]:
+      if key in observation_space.spaces:
+        space = observation_space[key]
+        self.specs[key] = ((num_envs, num_agents, *space.shape), space.dtype)
+    if "Market" in observation_space.spaces:
+      space = observation_space["Market"]
+      self.specs["Market"] = ((num_envs, *space.shape), space.dtype)
+    self.specs["CurrentTick"] = ((num_envs, num_agents), np.int64)
+    self.specs["AgentId"] = ((num_envs, num_agents), np.int64)
+    self.specs["Mask"] = ((num_envs, num_agents), bool)
+
+    self.targets = []
+    if config.PROVIDE_ACTION_TARGETS:
+      for atn, args in observation_space["ActionTargets"].items():
+        for arg, space in args.items():
+          self.targets.append((atn, arg))
+          self.specs[(atn, arg)] = ((num_envs, num_agents, space.n), np.int8)
+
+    self.specs["rewards"] = ((num_envs, num_agents), np.float32)
+    self.specs["dones"] = ((num_envs, num_agents), bool)
+    self.specs["actions"] = ((num_envs, num_agents, len(action.argument_columns(config))), np.int32)
+
+    self.offsets = {}
+    self.size = 0
+    for key, (shape, dtype) in self.specs.items():
+      self.offsets[key] = self.size
+      nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+      self.size += -(-nbytes // 64) * 64
+
+  def views(self, buf):
+    return {key: np.ndarray(shape, dtype, buffer=buf, offset=self.offsets[key])
+            for key, (shape, dtype) in self.specs.items()}
+
+
+def _write(arrays, index, layout, obs):
+  for key in layout.specs:
+    if key in obs and key != "Market":
+      arrays[key][index] = obs[key]
+  if "Market" in obs:
+    arrays["Market"][index] = obs["Market"][0]
+  for atn, arg in layout.targets:
+    arrays[(atn, arg)][index] = obs["ActionTargets"][atn][arg]
+
+def _worker(pipe, config, seed, index, auto_reset):
+  # the VecEnv lays out the shared memory from the spaces of the envs
+  env = BatchedEnv(config, seed)
+  pipe.send((env.possible_agents, env.observation_space(None)))
+  layout, shm = pipe.recv()
+
+  # the workers share the segment of the VecEnv, which unlinks it
+  arrays = layout.views(shm.buf)
+  reset_obs = None
+  try:
+    while True:
+      cmd, seed = pipe.recv()
+      if cmd == "reset":
+        obs, reset_obs = env.reset(seed=seed), None
+        arrays["rewards"][index] = 0
+        arrays["dones"][index] = False
+      elif cmd == "step" and reset_obs is not None:
+        obs, reset_obs = reset_obs, None
+        arrays["rewards"][index] = 0
+        arrays["dones"][index] = False
+      elif cmd == "step":
+        obs, rewards, dones, _ = env.step(arrays["actions"][index])
+        arrays["rewards"][index] = rewards
+        arrays["dones"][index] = dones
+      else:
+        break
+      _write(arrays, index, layout, obs)
+      pipe.send(None)
+
+      if cmd == "step" and auto_reset and arrays["dones"][index].all():
+        reset_obs = env.reset()
+  finally:
+    del arrays
+    shm.close()
+
+
+class VecEnv:
+  '''Steps num_envs BatchedEnvs, one per worker process, and returns
+  their observations, rewards and dones stacked by env'''
+
+  def __init__(self, config=None, num_envs=1, seed=None,
+               auto_reset=False, context=None):
+    config = config or nmmo.config.Default()
+    assert not config.OBS_RAGGED_ENTITIES, "VecEnv needs padded entities"
+    self.config = config
+    self.num_envs = num_envs
+    self.seed = seed
+    self.columns = action.argument_columns(config)
+    self._shm = None
+
+    # the maps are generated once, here, for all the workers to load
+    config.MAP_GENERATOR(config).generate_all_maps()
+    worker_config = copy.copy(config)
+    worker_config.MAP_FORCE_GENERATION = False
+
+    # the segment is created after the workers start, and the workers must
+    #   share the parent's resource tracker, or theirs unlinks it when they exit
+    resource_tracker.ensure_running()
+    ctx = context or mp.get_context()
+    self._waiting = False
+    self._pipes = []
+    self._procs = []
+    for index in range(num_envs):
+      parent, child = ctx.Pipe()
+      args = (child, worker_config, self._env_seed(index), index, auto_reset)
+      proc = ctx.Process(target=_worker, args=args, daemon=True)
+      proc.start()
+      child.close()
+      self._pipes.append(parent)
+      self._procs.append(proc)
+
+    # the envs are built in the workers, which send back their spaces
+    replies = [pipe.recv() for pipe in self._pipes]
+    self.possible_agents, observation_space = replies[0]
+    self._layout = _Layout(
+      config, num_envs, len(self.possible_agents), observation_space)
+
+    self._shm = shared_memory.SharedMemory(create=True, size=self._layout.size)
+    self._arrays = self._layout.views(self._shm.buf)
+    self.actions = self._arrays["actions"]
+    self.actions.fill(-1)
+    for pipe in self._pipes:
+      pipe.send((self._layout, self._shm))
+
+  def _env_seed(self, index, seed=None):
+    seed = self.seed if seed is None else seed
+    return None if seed is None else seed + index
+
+  def _send(self, cmds):
+    assert not self._waiting, "step_wait() was not called"
+    for pipe, cmd in zip(self._pipes, cmds):
+      pipe.send(cmd)
+    self._waiting = True
+
+  def _wait(self):
+    for pipe in self._pipes:
+      pipe.recv()
+    self._waiting = False
+
+  def _obs(self):
+    obs = {key: self._arrays[key] for key in self._layout.specs
+           if isinstance(key, str) and key not in ("rewards", "dones", "actions")}
+    if self._layout.targets:
+      obs["ActionTargets"] = {}
+      for atn, arg in self._layout.targets:
+        obs["ActionTargets"].setdefault(atn, {})[arg] = self._arrays[(atn, arg)]
+    return obs
+
+  def reset(self, seed=None):
+    '''Reset all envs, env i with seed + i'''
+    self._send([("reset", self._env_seed(i, seed)) for i in range(self.num_envs)])
+    self._wait()
+    self.actions.fill(-1)
+    return self._obs()
+
+  def step_async(self, actions=None):
+    '''Start stepping all envs with actions, by default the ones in
+    self.actions'''
+    if actions is not None:
+      self.actions[:] = actions
+    self._send([("step", None)] * self.num_envs)
+
+  def step_wait(self):
+    '''Wait for the envs to finish the step started by step_async()'''
+    self._wait()
+    return self._obs(), self._arrays["rewards"], self._arrays["dones"]
+
+  def step(self, actions=None):
+    self.step_async(actions)
+    return self.step_wait()
+
+  def close(self):
+    if self._shm is None:
+      return
+    for pipe in self._pipes:
+      try:
+        pipe.send(("close", None))
+      except (BrokenPipeError, OSError):
+        pass
+    for proc in self._procs:
+      proc.join(timeout=5)
+      if proc.is_alive():
+        proc.terminate()
+    self._arrays = None
+    self.actions = None
+    self._shm.close()
+    self._shm.unlink()
+    self._shm = None
+
+  def __del__(self):
+    if getattr(self, "_shm", None) is not None:
+      self.close()
@@ -25,14 +25,48 @@ See numpy_datastore.py for an implementation.
 class DataTable:
   def __init__(self, num_columns: int):
     self._num_columns = num_columns
-    self._id_allocator = IdAllocator(100)
+    self._id_allocator = IdAllocator(1)
 
-  def reset(self):
-    self._id_allocator = IdAllocator(100)
+  def reset(self, shrink: bool = False): # pylint: disable=unused-argument
+    '''Frees all rows. With shrink, the table may also give back the
+    memory it did not need during the last episode'''
+    self._id_allocator = IdAllocator(1)
 
   def update(self, row_id: int, col: int, value):
     raise NotImplementedError
 
+  def update_many(self, rows: List[int], col: int, values):
+    raise NotImplementedError
+
+  def flush(self):
+    # Applies any writes the table buffered, see numpy_datastore.py
+    pass
+
+  def begin_tick(self, tick: int):
+    '''Changes made from now on are stamped with tick'''
+    raise NotImplementedError
+
+  def changes_since(self, tick: int, columns: bool = False):
+    '''Ids of the rows changed after tick, including the rows that were
+    allocated or removed. With columns, also returns a boolean mask of
+    the changed cells of these rows, which is only exact for the tables
+    that track their cells'''
+    raise NotImplementedError
+
+  def write_buffer(self, row_id: int, col: int): # pylint: disable=unused-argument
+    '''Returns (buffer, key) if writes to the cell may be stored as
+    buffer[key] = value and applied at the next flush, or None if they
+    must go through update'''
+    return None
+
+  def snapshot(self):
+    '''Returns a copy of the table's contents that restore() can load
+    any number of times'''
+    raise NotImplementedError
+
+  def restore(self, snapshot):
+    raise NotImplementedError
+
   def get(self, ids: List[id]):
     raise NotImplementedError
 
@@ -48,6 +82,16 @@ class DataTable:
   def window(self, row_idx: int, col_idx: int, row: int, col: int, radius: int):
     raise NotImplementedError
 
+  def window_nearest(self, row_idx: int, col_idx: int, row: int, col: int, radius: int,
+                     num: int, id_idx: int = None, center_id=None):
+    raise NotImplementedError
+
+  def add_spatial_index(self, row_idx: int, col_idx: int, cell_size: int):
+    raise NotImplementedError
+
+  def add_index(self, col: int):
+    raise NotImplementedError
+
   def remove_row(self, row_id: int):
     raise NotImplementedError
 
@@ -58,6 +102,8 @@ class DataTable:
     raise NotImplementedError
 
 class DatastoreRecord:
+  __slots__ = ('datastore', 'table', 'id')
+
   def __init__(self, datastore, table: DataTable, row_id: int) -> None:
     self.datastore = datastore
     self.table = table
@@ -66,6 +112,9 @@ class DatastoreRecord:
   def update(self, col: int, value):
     self.table.update(self.id, col, value)
 
+  def write_buffer(self, col: int):
+    return self.table.write_buffer(self.id, col)
+
   def get(self, col: int):
     return self.table.get(self.id)[col]
 
@@ -75,10 +124,19 @@ class DatastoreRecord:
 class Datastore:
   def __init__(self) -> None:
     self._tables: Dict[str, DataTable] = {}
-
-  def register_object_type(self, object_type: str, num_colums: int):
+    self.tick = 0
+
+  def register_object_type(self, object_type: str, num_colums: int,
+                           indexes: List[int] = (), dtypes: List = None,
+                           capacity: int = None, track_cells: bool = False):
+    '''capacity is the number of rows the table is expected to need.
+    track_cells keeps the tick of each cell's last change, for
+    changes_since(columns=True), at the cost of an int32 per cell'''
     if object_type not in self._tables:
-      self._tables[object_type] = self._create_table(num_colums)
+      self._tables[object_type] = self._create_table(
+        num_colums, dtypes, capacity, track_cells)
+      for col in indexes:
+        self._tables[object_type].add_index(col)
 
   def create_record(self, object_type: str) -> DatastoreRecord:
     table = self._tables[object_type]
@@ -88,5 +146,28 @@ class Datastore:
   def table(self, object_type: str) -> DataTable:
     return self._tables[object_type]
 
-  def _create_table(self, num_columns: int) -> DataTable:
+  def flush(self):
+    for table in self._tables.values():
+      table.flush()
+
+  def begin_tick(self, tick: int):
+    '''Starts stamping the changes to the tables with tick. Ticks start
+    over when the tables are reset, so consumers must too'''
+    self.tick = tick
+    for table in self._tables.values():
+      table.begin_tick(tick)
+
+  def changes_since(self, tick: int, columns: bool = False) -> Dict:
+    '''Rows of each table that changed after tick, see DataTable.changes_since'''
+    return {name: table.changes_since(tick, columns) for name, table in self._tables.items()}
+
+  def snapshot(self) -> Dict:
+    return {name: table.snapshot() for name, table in self._tables.items()}
+
+  def restore(self, snapshot: Dict):
+    for name, table_snapshot in snapshot.items():
+      self._tables[name].restore(table_snapshot)
+
+  def _create_table(self, num_columns: int, dtypes: List = None,
+                    capacity: int = None, track_cells: bool = False) -> DataTable:
     raise NotImplementedError
@@ -1,21 +1,54 @@
-from ordered_set import OrderedSet
+from collections import deque
 
 class IdAllocator:
+  '''Hands out row ids in first-freed, first-allocated order: fresh ids
+  in ascending order, then freed ids in the order they were returned.
+  Allocate and remove are O(1), expand is O(1) unless ids are waiting
+  in the free queue'''
   def __init__(self, max_id):
     # Key 0 is reserved as padding
     self.max_id = 1
-    self.free  = OrderedSet()
+    # The ids in [_fresh_start, _fresh_end) were never handed out, and
+    # are queued ahead of the ones in free
+    self._fresh_start = 1
+    self._fresh_end = 1
+    self.free = deque()
+    self._is_free = bytearray(1)
     self.expand(max_id)
 
+  @property
+  def num_free(self):
+    return self._fresh_end - self._fresh_start + len(self.free)
+
   def full(self):
-    return len(self.free) == 0
+    return self.num_free == 0
 
   def remove(self, row_id):
-    self.free.add(row_id)
+    if not self._is_free[row_id]:
+      self._is_free[row_id] = 1
+      self.free.append(row_id)
 
   def allocate(self):
-    return self.free.pop(0)
+    if self._fresh_start < self._fresh_end:
+      row_id = self._fresh_start
+      self._fresh_start += 1
+    elif self.free:
+      row_id = self.free.popleft()
+    else:
+      raise KeyError('No free ids left')
+    self._is_free[row_id] = 0
+    return row_id
 
   def expand(self, max_id):
-    self.free.update(OrderedSet(range(self.max_id, max_id)))
+    if max_id <= self.max_id:
+      return
+    if self.free:
+      # The new ids queue up behind the ones already freed
+      self.free.extend(range(self.max_id, max_id))
+    else:
+      # Either the fresh range is used up, or it ends at the current max_id
+      if self._fresh_start == self._fresh_end:
+        self._fresh_start = self.max_id
+      self._fresh_end = max_id
+    self._is_free.extend(b'\x01' * (max_id - self.max_id))
     self.max_id = max_id
@@ -1,70 +1,593 @@
-from typing import List
+import copy
+import math
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
 
 import numpy as np
 
 from nmmo.datastore.datastore import Datastore, DataTable
 
 
-class NumpyTable(DataTable):
-  def __init__(self, num_columns: int, initial_size: int, dtype=np.float32):
+class SpatialIndex:
+  '''Uniform grid of cell_size x cell_size buckets keyed on a table's
+  row/col columns. Each allocated row lives in the bucket of its current
+  position, so a window query only touches the rows in nearby cells'''
+  def __init__(self, row_idx: int, col_idx: int, cell_size: int):
+    self.row_idx = row_idx
+    self.col_idx = col_idx
+    self.cell_size = cell_size
+    self.columns = (row_idx, col_idx)
+    self._frozen = None
+    self.clear()
+
+  def clear(self):
+    self._pos: Dict[int, List[int]] = {}
+    self._cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+    # Bucket contents as id arrays, rebuilt lazily after a bucket changes
+    self._cell_ids: Dict[Tuple[int, int], np.ndarray] = {}
+    # Copy of the contents returned by snapshot(), until the next change
+    self._frozen = None
+
+  def snapshot(self):
+    if self._frozen is None:
+      self._frozen = ({k: list(v) for k, v in self._pos.items()},
+                      {k: frozenset(v) for k, v in self._cells.items() if v})
+    return self._frozen
+
+  def restore(self, frozen):
+    if frozen is self._frozen:
+      return # unchanged since the snapshot
+    pos, cells = frozen
+    self.clear()
+    self._pos.update((k, list(v)) for k, v in pos.items())
+    self._cells.update((k, set(v)) for k, v in cells.items())
+    self._frozen = frozen
+
+  def _cell(self, pos):
+    return (pos[0] // self.cell_size, pos[1] // self.cell_size)
+
+  def _insert(self, row_id: int, cell):
+    self._cells[cell].add(row_id)
+    self._cell_ids.pop(cell, None)
+
+  def _discard(self, row_id: int, cell):
+    self._cells[cell].discard(row_id)
+    self._cell_ids.pop(cell, None)
+
+  def add(self, row_id: int, values):
+    self._frozen = None
+    pos = [math.floor(values[self.row_idx]), math.floor(values[self.col_idx])]
+    self._pos[row_id] = pos
+    self._insert(row_id, self._cell(pos))
+
+  def remove(self, row_id: int):
+    pos = self._pos.pop(row_id, None)
+    if pos is not None:
+      self._frozen = None
+      self._discard(row_id, self._cell(pos))
+
+  def update(self, row_id: int, col: int, value):
+    pos = self._pos.get(row_id)
+    if pos is None:
+      return # not an allocated row
+
+    self._frozen = None
+    old_cell = self._cell(pos)
+    pos[0 if col == self.row_idx else 1] = math.floor(value)
+    new_cell = self._cell(pos)
+    if new_cell != old_cell:
+      self._discard(row_id, old_cell)
+      self._insert(row_id, new_cell)
+
+  def _ids(self, cell):
+    ids = self._cell_ids.get(cell)
+    if ids is None:
+      ids = np.fromiter(self._cells.get(cell, ()), dtype=np.int64)
+      self._cell_ids[cell] = ids
+    return ids
+
+  def query(self, row: int, col: int, radius: int) -> np.ndarray:
+    '''Sorted ids of the rows in the cells overlapping the window.
+    The caller still has to filter them by exact distance'''
+    size = self.cell_size
+    row_cells = range(math.floor(row - radius) // size, math.floor(row + radius) // size + 1)
+    col_cells = range(math.floor(col - radius) // size, math.floor(col + radius) // size + 1)
+    ids = np.concatenate([self._ids((r, c)) for r in row_cells for c in col_cells])
+    ids.sort()
+    return ids
+
+
+class GridIndex:
+  '''Marks a table whose rows 1..size*size hold the cells of a size x size
+  grid in row-major order, so that windows are slices of the table.
+  Adding, removing or moving a row breaks the layout, and the table goes
+  back to its other indexes'''
+  def __init__(self, row_idx: int, col_idx: int, size: int):
+    self.columns = (row_idx, col_idx)
+    self.size = size
+    self.valid = True
+
+  def clear(self):
+    self.valid = False
+
+  def snapshot(self):
+    return self.valid
+
+  def restore(self, valid):
+    self.valid = valid
+
+  def add(self, row_id: int, values): # pylint: disable=unused-argument
+    self.valid = False
+
+  def remove(self, row_id: int): # pylint: disable=unused-argument
+    self.valid = False
+
+  def update(self, row_id: int, col: int, value): # pylint: disable=unused-argument
+    self.valid = False
+
+
+class HashIndex:
+  '''Maps each non-zero value of a column to the set of rows holding it.
+  Free rows are zero-filled, so zero is never indexed and queries on zero
+  fall back to a full scan'''
+  def __init__(self, col: int, dtype, bounds: Tuple[float, float]):
+    self.col = col
+    self.columns = (col,)
+    self._cast = np.dtype(dtype).type
+    self._min, self._max = bounds
+    self._frozen = None
+    self.clear()
+
+  def clear(self):
+    self._values: Dict[int, float] = {}
+    self._buckets: Dict[float, Set[int]] = defaultdict(set)
+    # Copy of the contents returned by snapshot(), until the next change
+    self._frozen = None
+
+  def snapshot(self):
+    if self._frozen is None:
+      self._frozen = (dict(self._values),
+                      {k: frozenset(v) for k, v in self._buckets.items()})
+    return self._frozen
+
+  def restore(self, frozen):
+    if frozen is self._frozen:
+      return # unchanged since the snapshot
+    values, buckets = frozen
+    self.clear()
+    self._values.update(values)
+    self._buckets.update((k, set(v)) for k, v in buckets.items())
+    self._frozen = frozen
+
+  def __len__(self):
+    return len(self._values)
+
+  @property
+  def num_keys(self):
+    return len(self._buckets)
+
+  def key(self, value):
+    # Normalize to the stored value, so that e.g. 3, 3.0 and np.float32(3) match
+    return self._cast(min(self._max, max(self._min, value))).item()
+
+  def lookup(self, value):
+    '''Key of a query value, or None if the column cannot hold it exactly'''
+    try:
+      key = self.key(value)
+    except (OverflowError, ValueError):
+      return None
+    return key if key == value else None
+
+  def add(self, row_id: int, values):
+    self._insert(row_id, values[self.col])
+
+  def remove(self, row_id: int):
+    value = self._values.pop(row_id, None)
+    if value is not None:
+      self._frozen = None
+      bucket = self._buckets[value]
+      bucket.discard(row_id)
+      if not bucket:
+        del self._buckets[value]
+
+  def update(self, row_id: int, col: int, value):
+    assert col == self.col
+    self.remove(row_id)
+    self._insert(row_id, value)
+
+  def _insert(self, row_id: int, value):
+    value = self.key(value)
+    if value != 0:
+      self._frozen = None
+      self._values[row_id] = value
+      self._buckets[value].add(row_id)
+
+  def keys(self):
+    return list(self._buckets)
+
+  def count(self, values) -> int:
+    return sum(len(self._buckets.get(v, ())) for v in values)
+
+  def rows(self, values) -> np.ndarray:
+    ids = []
+    for value in values:
+      ids.extend(self._buckets.get(value, ()))
+    ids = np.array(ids, dtype=np.int64)
+    ids.sort()
+    return ids
+
+
+class NumpyTable(DataTable): # pylint: disable=too-many-public-methods
+  def __init__(self, num_columns: int, initial_size: int, dtype=np.float32,
+               track_cells: bool = False):
+    '''dtype is either one dtype for the whole table or a list of per-column dtypes.
+    With track_cells, the tick of each cell's last change is kept besides the row's'''
     super().__init__(num_columns)
-    self._dtype  = dtype
+    if isinstance(dtype, (list, tuple)):
+      assert len(dtype) == num_columns, 'Expected one dtype per column'
+      self._col_dtypes = [np.dtype(d) for d in dtype]
+    else:
+      self._col_dtypes = [np.dtype(dtype)] * num_columns
+    # Rows are handed out as 2-D arrays, so the columns share the narrowest
+    # dtype that can hold all of them
+    self._dtype = np.result_type(*self._col_dtypes)
+    # Integer columns saturate at the bounds of their own dtype instead of
+    # wrapping. Buffered values are clamped in a wide dtype when flushed
+    self._wide_dtype = np.int64 if np.issubdtype(self._dtype, np.integer) else np.float64
+    self._bounds = np.array([
+      (np.iinfo(d).min, np.iinfo(d).max) if np.issubdtype(d, np.integer) else (-np.inf, np.inf)
+      for d in self._col_dtypes], dtype=self._wide_dtype).reshape(-1, 2)
     self._initial_size = initial_size
     self._max_rows = 0
+    # One past the highest row used since the last reset
+    self._high_water = 1
     self._data = np.zeros((0, self._num_columns), dtype=self._dtype)
+    self._indexes = []
+    self._col_indexes = {}
+    self._spatial_index = None
+    self._grid_index = None
+    self._hash_indexes: Dict[int, HashIndex] = {}
+    # Scalar writes are buffered as {flat index: value} and applied in bulk
+    # before the next read, since numpy's per-item assignment is slow
+    self._pending: Dict[int, float] = {}
+    self._max_pending = 1 << 16
+    # Tick of the last change to each row and, if tracked, to each cell,
+    # -1 if never changed
+    self._tick = 0
+    self._row_tick = np.full(0, -1, dtype=np.int32)
+    self._cell_tick = None
+    if track_cells:
+      self._cell_tick = np.full((0, self._num_columns), -1, dtype=np.int32)
     self._expand(self._initial_size)
 
-  def reset(self):
+  def reset(self, shrink: bool = False):
     super().reset() # resetting _id_allocator
-    self._max_rows = 0
-    self._data = np.zeros((0, self._num_columns), dtype=self._dtype)
-    self._expand(self._initial_size)
+    self._pending.clear()
+    for index in self._indexes:
+      index.clear()
+
+    # Keep the rows of the last episode, unless it left most of them unused
+    max_rows = max(self._initial_size, 2 * self._high_water)
+    self._high_water = 1
+    if shrink and max_rows < self._max_rows:
+      self._max_rows = 0
+      self._data = np.zeros((0, self._num_columns), dtype=self._dtype)
+      self._row_tick = self._row_tick[:0]
+      if self._cell_tick is not None:
+        self._cell_tick = self._cell_tick[:0]
+      self._expand(max_rows)
+    else:
+      self._data.fill(0)
+      self._id_allocator.expand(self._max_rows)
+    self._stamp_all()
+
+  def snapshot(self):
+    self.flush()
+    return (self._data.copy(), copy.deepcopy(self._id_allocator),
+            [index.snapshot() for index in self._indexes])
+
+  def restore(self, snapshot):
+    data, id_allocator, indexes = snapshot
+    self._pending.clear()
+    if len(data) > self._max_rows:
+      self._expand(len(data))
+    # Rows past the snapshot are free, and stay behind the allocator's ids
+    self._data[:len(data)] = data
+    self._data[len(data):] = 0
+    self._id_allocator = copy.deepcopy(id_allocator)
+    for index, frozen in zip(self._indexes, indexes):
+      index.restore(frozen)
+    self._stamp_all()
+
+  def begin_tick(self, tick: int):
+    self.flush()
+    self._tick = tick
+
+  def changes_since(self, tick: int, columns: bool = False):
+    '''Without track_cells, all the cells of the changed rows count as changed'''
+    self.flush()
+    rows = np.flatnonzero(self._row_tick > tick)
+    if not columns:
+      return rows
+    if self._cell_tick is None:
+      return rows, np.ones((len(rows), self._num_columns), dtype=bool)
+    return rows, self._cell_tick[rows] > tick
+
+  def _stamp(self, flat_idx: np.ndarray):
+    if self._cell_tick is not None:
+      self._cell_tick.reshape(-1)[flat_idx] = self._tick
+    self._row_tick[flat_idx // self._num_columns] = self._tick
+
+  def _stamp_all(self):
+    self._row_tick.fill(self._tick)
+    if self._cell_tick is not None:
+      self._cell_tick.fill(self._tick)
+
+  def add_spatial_index(self, row_idx: int, col_idx: int, cell_size: int):
+    # NOTE: only the rows allocated after this call are indexed
+    assert self._spatial_index is None, 'Table already has a spatial index'
+    self._spatial_index = SpatialIndex(row_idx, col_idx, cell_size)
+    self._add_index(self._spatial_index)
+
+  def add_grid_index(self, row_idx: int, col_idx: int, size: int):
+    assert self._grid_index is None, 'Table already has a grid index'
+    self.flush()
+    cells = self._data[1:1 + size * size]
+    rows, cols = np.divmod(np.arange(size * size), size)
+    assert len(cells) == size * size and np.array_equal(cells[:, row_idx], rows) \
+      and np.array_equal(cells[:, col_idx], cols), 'Rows are not laid out as a grid'
+    self._grid_index = GridIndex(row_idx, col_idx, size)
+    self._add_index(self._grid_index)
+
+  def add_index(self, col: int):
+    # NOTE: only the rows allocated after this call are indexed
+    assert col not in self._hash_indexes, f'Column {col} is already indexed'
+    self._hash_indexes[col] = HashIndex(col, self._dtype, self._bounds[col].tolist())
+    self._add_index(self._hash_indexes[col])
+
+  def _add_index(self, index):
+    self._indexes.append(index)
+    for col in index.columns:
+      self._col_indexes.setdefault(col, []).append(index)
 
   def update(self, row_id: int, col: int, value):
-    self._data[row_id, col] = value
+    if not 0 <= row_id < self._max_rows:
+      raise IndexError(f'Row {row_id} is out of bounds for {self._max_rows} rows')
+    self._pending[row_id * self._num_columns + col] = value
+    if col in self._col_indexes:
+      for index in self._col_indexes[col]:
+        index.update(row_id, col, value)
+
+  def write_buffer(self, row_id: int, col: int):
+    # Indexed columns have to see every write
+    if col in self._col_indexes or not 0 <= row_id < self._max_rows:
+      return None
+    return self._pending, row_id * self._num_columns + col
+
+  def update_many(self, rows: List[int], col: int, values):
+    rows = np.asarray(rows, dtype=np.int64)
+    values = np.broadcast_to(values, rows.shape)
+    values = np.clip(values, *self._bounds[col]).astype(self._dtype)
+    # Buffered writes to these cells must not land on top of this one
+    self.flush()
+    self._stamp(rows[self._data[rows, col] != values] * self._num_columns + col)
+    self._data[rows, col] = values
+    if col in self._col_indexes:
+      for index in self._col_indexes[col]:
+        for row_id, value in zip(rows.tolist(), values.tolist()):
+          index.update(row_id, col, value)
+
+  def flush(self):
+    if self._pending:
+      pending = self._pending
+      idx = np.fromiter(pending.keys(), np.int64, len(pending))
+      bounds = self._bounds[idx % self._num_columns]
+      values = np.clip(
+        np.fromiter(pending.values(), self._wide_dtype, len(pending)),
+        bounds[:, 0], bounds[:, 1]).astype(self._dtype)
+      data = self._data.reshape(-1)
+      # Rewriting a cell with its current value is not a change
+      self._stamp(idx[data[idx] != values])
+      data[idx] = values
+      pending.clear()
 
   def get(self, ids: List[int]):
+    self.flush()
     return self._data[ids]
 
+  def _selective(self, num_rows: int) -> bool:
+    # Gathering ids from an index costs roughly 16x more per row than
+    # a vectorized scan, so only use it when few rows are involved
+    return num_rows * 16 < self._max_rows
+
   def where_eq(self, col: int, value):
+    self.flush()
+    index = self._hash_indexes.get(col)
+    if index is not None:
+      key = index.lookup(value)
+      if key not in (None, 0) and self._selective(index.count([key])):
+        return self._data[index.rows([key])]
+
     return self._data[self._data[:,col] == value]
 
   def where_neq(self, col: int, value):
+    self.flush()
+    index = self._hash_indexes.get(col)
+    if index is not None and index.lookup(value) == 0 and \
+       self._selective(len(index) + index.num_keys):
+      # All rows with a non-zero value are in the index
+      return self._data[index.rows(index.keys())]
+
     return self._data[self._data[:,col] != value]
 
   def where_in(self, col: int, values: List):
+    self.flush()
+    index = self._hash_indexes.get(col)
+    if index is not None:
+      # values the column cannot hold match no rows
+      keys = {index.lookup(v) for v in values} - {None}
+      if 0 not in keys and self._selective(index.count(keys)):
+        return self._data[index.rows(keys)]
+
     return self._data[np.isin(self._data[:,col], values)]
 
   def window(self, row_idx: int, col_idx: int, row: int, col: int, radius: int):
-    return self._data[(
-      (np.abs(self._data[:,row_idx] - row) <= radius) &
-      (np.abs(self._data[:,col_idx] - col) <= radius)
+    self.flush()
+    grid = self._grid_index
+    if grid is not None and grid.valid and grid.columns == (row_idx, col_idx):
+      # The window is a slice of the grid, clipped to its edges
+      size = grid.size
+      rows = slice(max(math.ceil(row - radius), 0), max(math.floor(row + radius) + 1, 0))
+      cols = slice(max(math.ceil(col - radius), 0), max(math.floor(col + radius) + 1, 0))
+      cells = self._data[1:1 + size * size].reshape(size, size, self._num_columns)
+      return np.array(cells[rows, cols]).reshape(-1, self._num_columns)
+
+    index = self._spatial_index
+    if index is not None and index.columns == (row_idx, col_idx):
+      data = self._data[index.query(row, col, radius)]
+    else:
+      data = self._data
+
+    return data[(
+      (np.abs(data[:,row_idx] - row) <= radius) &
+      (np.abs(data[:,col_idx] - col) <= radius)
     ).ravel()]
 
+  def window_nearest(self, row_idx: int, col_idx: int, row: int, col: int, radius: int,
+                     num: int, id_idx: int = None, center_id=None):
+    '''The num rows of window() nearest to (row, col) by L-inf distance,
+    nearest first and in row order among equals. Only the distances are
+    partitioned, and only the selected rows are copied. The row whose
+    id_idx column is center_id ranks ahead of everything else'''
+    self.flush()
+    index = self._spatial_index
+    if index is not None and index.columns == (row_idx, col_idx):
+      candidates = index.query(row, col, radius)
+      data = self._data[candidates]
+    else:
+      candidates = np.arange(len(self._data))
+      data = self._data
+
+    distance = np.maximum(np.abs(data[:, row_idx] - row), np.abs(data[:, col_idx] - col))
+    within = distance <= radius
+    candidates, distance = candidates[within], distance[within]
+    if center_id is not None:
+      distance[data[within, id_idx] == center_id] = -1
+
+    # rank by distance, then by row
+    rank = distance * len(self._data) + candidates
+    if len(candidates) > num:
+      rank = rank[np.argpartition(rank, num - 1)[:num]]
+    rank.sort()
+    return self._data[(rank % len(self._data)).astype(np.int64)]
+
+  def windows(self, row_idx: int, col_idx: int, rows: List[int], cols: List[int], radius: int):
+    '''window() around each of the given centers. With a grid index, the
+    windows that fit in the grid are gathered at once, in O(window) each'''
+    self.flush()
+    grid = self._grid_index
+    if grid is None or not grid.valid or grid.columns != (row_idx, col_idx):
+      return [self.window(row_idx, col_idx, r, c, radius) for r, c in zip(rows, cols)]
+
+    size, width = grid.size, 2 * radius + 1
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    inside = (rows >= radius) & (rows < size - radius) & \
+             (cols >= radius) & (cols < size - radius)
+
+    # (size, size, columns) view of the cells, then every width x width window
+    cells = self._data[1:1 + size * size].reshape(size, size, self._num_columns)
+    views = np.lib.stride_tricks.sliding_window_view(cells, (width, width), axis=(0, 1))
+    batch = views[rows[inside] - radius, cols[inside] - radius]
+    batch = batch.transpose(0, 2, 3, 1).reshape(-1, width * width, self._num_columns)
+
+    # Windows clipped by the grid's edges take the general path
+    batch = iter(batch)
+    return [next(batch) if fits else self.window(row_idx, col_idx, r, c, radius)
+            for r, c, fits in zip(rows.tolist(), cols.tolist(), inside.tolist())]
+
+  def grid_windows(self, row_idx: int, col_idx: int, value_idx: int,
+                   rows: List[int], cols: List[int], radius: int, fill):
+    '''The value_idx column of the windows around the given centers, as a
+    (len(rows), 2*radius+1, 2*radius+1) array of grids centered on them.
+    Cells without a row, e.g. outside the map, hold fill'''
+    self.flush()
+    width = 2 * radius + 1
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    out = np.full((len(rows), width, width), fill, dtype=self._data.dtype)
+
+    grid = self._grid_index
+    if grid is None or not grid.valid or grid.columns != (row_idx, col_idx):
+      for idx, (r, c) in enumerate(zip(rows.tolist(), cols.tolist())):
+        window = self.window(row_idx, col_idx, r, c, radius)
+        out[idx, window[:, row_idx].astype(np.int64) - r + radius,
+            window[:, col_idx].astype(np.int64) - c + radius] = window[:, value_idx]
+      return out
+
+    # Gather all windows at once from the (size, size) view of the column,
+    # with the indexes clipped to the grid, then fill the cells outside it
+    size = grid.size
+    cells = self._data[1:1 + size * size, value_idx].reshape(size, size)
+    offsets = np.arange(-radius, radius + 1)
+    grid_rows, grid_cols = rows[:, None] + offsets, cols[:, None] + offsets
+    inside = ((grid_rows >= 0) & (grid_rows < size))[:, :, None] & \
+             ((grid_cols >= 0) & (grid_cols < size))[:, None, :]
+    out[:] = cells[np.clip(grid_rows, 0, size - 1)[:, :, None],
+                   np.clip(grid_cols, 0, size - 1)[:, None, :]]
+    out[~inside] = fill
+    return out
+
   def add_row(self) -> int:
+    # Bound the buffer when many records are created without any reads
+    if len(self._pending) > self._max_pending:
+      self.flush()
     if self._id_allocator.full():
       self._expand(self._max_rows * 2)
     row_id = self._id_allocator.allocate()
+    if row_id >= self._high_water:
+      self._high_water = row_id + 1
+    self._row_tick[row_id] = self._tick
+    for index in self._indexes:
+      index.add(row_id, self._data[row_id])
     return row_id
 
   def remove_row(self, row_id: int) -> int:
     self._id_allocator.remove(row_id)
+    start = row_id * self._num_columns
+    for key in range(start, start + self._num_columns):
+      self._pending.pop(key, None)
     self._data[row_id] = 0
+    self._row_tick[row_id] = self._tick
+    if self._cell_tick is not None:
+      self._cell_tick[row_id] = self._tick
+    for index in self._indexes:
+      index.remove(row_id)
+
+  def _allocate(self, max_rows: int) -> np.ndarray:
+    return np.zeros((max_rows, self._num_columns), dtype=self._dtype)
 
   def _expand(self, max_rows: int):
     assert max_rows > self._max_rows
-    data = np.zeros((max_rows, self._num_columns), dtype=self._dtype)
+    data = self._allocate(max_rows)
     data[:self._max_rows] = self._data
+    new_rows = max_rows - self._max_rows
+    self._row_tick = np.concatenate([self._row_tick, np.full(new_rows, -1, np.int32)])
+    if self._cell_tick is not None:
+      self._cell_tick = np.concatenate([
+        self._cell_tick, np.full((new_rows, self._num_columns), -1, np.int32)])
     self._max_rows = max_rows
     self._id_allocator.expand(max_rows)
     self._data = data
 
   def is_empty(self) -> bool:
+    self.flush()
     all_data_zero = np.sum(self._data)==0
     # 0th row is reserved as padding, so # of free ids is _max_rows-1
-    all_id_free = len(self._id_allocator.free) == self._max_rows-1
+    all_id_free = self._id_allocator.num_free == self._max_rows-1
     return all_data_zero and all_id_free
 
 class NumpyDatastore(Datastore):
-  def _create_table(self, num_columns: int) -> DataTable:
-    return NumpyTable(num_columns, 100)
+  def _create_table(self, num_columns: int, dtypes: List = None,
+                    capacity: int = None, track_cells: bool = False) -> DataTable:
+    return NumpyTable(num_columns, capacity or 100, dtypes or np.float32, track_cells)
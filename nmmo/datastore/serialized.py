@@ -4,6 +4,9 @@ from ast import Tuple
 import math
 from types import SimpleNamespace
 from typing import Dict, List
+
+import numpy as np
+
 from nmmo.datastore.datastore import Datastore, DatastoreRecord
 
 """
@@ -13,43 +16,66 @@ in a structured way.
 The SerializedAttribute class represents a single attribute of a
 record and provides methods for updating and querying its value,
 as well as enforcing minimum and maximum bounds on the value.
+The attributes are class-level descriptors: each record only keeps
+a list of its current values, and the SerializedAttribute views are
+created when an attribute is first used.
 
 The SerializedState class serves as a base class for creating
 serialized representations of specific types of data, using a
 list of attribute names to define the structure of the data.
 The subclass method is a factory method for creating subclasses
 of SerializedState that are tailored to specific types of data.
+Each attribute can declare its own dtype; attributes without one
+are stored as float32.
 """
 
 class SerializedAttribute():
+  __slots__ = ('_name', '_vals', '_column', '_limits', '_record', '_buffer', '_key')
+
   def __init__(self,
       name: str,
-      datastore_record: DatastoreRecord,
-      column: int, min_val=-math.inf, max_val=math.inf) -> None:
+      vals: List,
+      column: int,
+      limits: Tuple[float, float],
+      datastore_record: DatastoreRecord) -> None:
     self._name = name
-    self.datastore_record = datastore_record
+    self._vals = vals
     self._column = column
-    self._min = min_val
-    self._max = max_val
-    self._val = 0
+    self._limits = limits
+    self._record = datastore_record
+    # Writes go straight into the table's write buffer when it allows it
+    self._buffer, self._key = datastore_record.write_buffer(column) or (None, None)
+
+  def __reduce__(self):
+    # The write buffer belongs to the table, so look it up again when loaded
+    return SerializedAttribute, (self._name, self._vals, self._column,
+                                 self._limits, self._record)
+
+  @property
+  def datastore_record(self):
+    return self._record
 
   @property
   def val(self):
-    return self._val
+    return self._vals[self._column]
 
   def update(self, value):
-    value = min(self._max, max(self._min, value))
+    min_val, max_val = self._limits
+    value = min(max_val, max(min_val, value))
 
-    self.datastore_record.update(self._column, value)
-    self._val = value
+    if self._buffer is not None:
+      self._buffer[self._key] = value
+    else:
+      self._record.update(self._column, value)
+    self._vals[self._column] = value
 
   @property
   def min(self):
-    return self._min
+    return self._limits[0]
 
   @property
   def max(self):
-    return self._max
+    return self._limits[1]
 
   def increment(self, val=1, max_v=math.inf):
     self.update(min(max_v, self.val + val))
@@ -81,14 +107,49 @@ class SerializedAttribute():
   def __ge__(self, other):
     return self.val >= other
 
+class SerializedAttributeDescriptor():
+  """Class-level accessor for one attribute of a SerializedState.
+  The SerializedAttribute views are created on first access, and kept
+  in the instance dict when the record has one"""
+  def __init__(self, name: str, column: int) -> None:
+    self._name = name
+    self._column = column
+
+  def __get__(self, state, owner=None):
+    if state is None:
+      return self
+
+    # pylint: disable=protected-access
+    view = SerializedAttribute(self._name, state._vals, self._column,
+                               state._limits[self._column], state.datastore_record)
+    # A non-data descriptor, so later lookups find the cached view first
+    if hasattr(state, '__dict__'):
+      state.__dict__[self._name] = view
+    return view
+
 class SerializedState():
+  __slots__ = ()
+
+  # Interned per-column limits, shared by all the records with the same limits
+  _limits_cache = {}
+
   @staticmethod
-  def subclass(name: str, attributes: List[str]):
+  def subclass(name: str, attributes: List[str], indexes: List[str] = (),
+               dtypes: Dict[str, type] = None):
+    dtypes = dtypes or {}
+    assert set(dtypes) <= set(attributes), \
+      f"Unknown attributes {set(dtypes) - set(attributes)}"
+
     class Subclass(SerializedState):
+      __slots__ = ('datastore_record', '_vals', '_limits')
+
       _name = name
       State = SimpleNamespace(
         attr_name_to_col = {a: i for i, a in enumerate(attributes)},
         num_attributes = len(attributes),
+        dtypes = [np.dtype(dtypes.get(a, np.float32)) for a in attributes],
+        # Columns that are looked up by value get a hash index
+        indexes = [attributes.index(a) for a in indexes],
         table = lambda ds: ds.table(name)
       )
 
@@ -96,15 +157,19 @@ class SerializedState():
                    limits: Dict[str, Tuple[float, float]] = None):
 
         limits = limits or {}
-        self.datastore_record = datastore.create_record(name)
+        self.new_record(datastore)
+
+        limits = tuple(limits.get(attr, (-math.inf, math.inf)) for attr in attributes)
+        self._limits = SerializedState._limits_cache.setdefault(limits, limits)
 
-        for attr, col in self.State.attr_name_to_col.items():
-          try:
-            setattr(self, attr,
-              SerializedAttribute(attr, self.datastore_record, col,
-                *limits.get(attr, (-math.inf, math.inf))))
-          except Exception as exc:
-            raise RuntimeError('Failed to set attribute' + attr) from exc
+      def new_record(self, datastore: Datastore):
+        # Moves the state to a new row of zeros, for objects that are reused.
+        # The cached views write to the old row, so they are dropped
+        self.datastore_record = datastore.create_record(name)
+        self._vals = [0] * len(attributes)
+        if hasattr(self, '__dict__'):
+          for attr in attributes:
+            self.__dict__.pop(attr, None)
 
       @classmethod
       def parse_array(cls, data) -> SimpleNamespace:
@@ -117,4 +182,7 @@ class SerializedState():
           attr: data[col] for attr, col in cls.State.attr_name_to_col.items()
         })
 
+    for col, attr in enumerate(attributes):
+      setattr(Subclass, attr, SerializedAttributeDescriptor(attr, col))
+
     return Subclass
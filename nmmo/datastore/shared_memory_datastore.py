@@ -0,0 +1,260 @@
+import os
+import secrets
+import time
+import weakref
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+
+from nmmo.datastore.datastore import DataTable
+from nmmo.datastore.numpy_datastore import NumpyDatastore, NumpyTable
+
+"""
+A NumpyDatastore whose tables live in shared memory, so that other
+processes (renderers, loggers, learners) can map them read-only
+without copies or pickling.
+
+The datastore owns a small header segment: a sequence counter followed
+by a directory with the shared memory segment, shape and dtype of each
+table. The counter works like a seqlock: it is odd while the tables
+are being written and even once a tick is published by flush(). A
+table that expands moves to a new segment and updates its directory
+entry, and readers remap it the next time they touch the table.
+
+Writer:
+  datastore = SharedMemoryDatastore()   # or config.DATASTORE_SHARED_MEMORY
+  ... datastore.name
+
+Reader, in any process:
+  reader = SharedMemoryReader(name)
+  tables = reader.read()                # consistent copies of all tables
+  entity = reader.view("Entity")        # zero-copy, may change under you
+"""
+
+MAX_TABLES = 16
+
+HEADER_DTYPE = np.dtype([
+  ("seq", "<i8"),
+  ("num_tables", "<i8"),
+  ("tables", [
+    ("name", "S32"),
+    ("segment", "S32"),
+    ("rows", "<i8"),
+    ("cols", "<i8"),
+    ("dtype", "S8"),
+  ], (MAX_TABLES,)),
+])
+
+# Segments created by the datastores of this process
+_OWNED_SEGMENTS = set()
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+  try:
+    # pylint: disable=unexpected-keyword-arg
+    return shared_memory.SharedMemory(name=name, track=False)
+  except TypeError:
+    # Before Python 3.13 attaching also registers the segment with this
+    # process's resource tracker, which would unlink it on exit
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and name not in _OWNED_SEGMENTS:
+      # pylint: disable=protected-access
+      from multiprocessing import resource_tracker
+      resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def _release(segments: Dict[str, shared_memory.SharedMemory], name: str, unlink: bool):
+  shm = segments.pop(name)
+  try:
+    shm.close()
+  except BufferError:
+    # Some array still points into the segment, it is unmapped with it
+    pass
+  if unlink:
+    shm.unlink()
+    _OWNED_SEGMENTS.discard(name)
+
+def _release_all(segments: Dict[str, shared_memory.SharedMemory], unlink: bool):
+  for name in list(segments):
+    _release(segments, name, unlink)
+
+
+class SharedMemoryTable(NumpyTable):
+  def __init__(self, datastore, slot: int, num_columns: int,
+               initial_size: int, dtype=np.float32, track_cells: bool = False):
+    self._datastore = datastore
+    self.slot = slot
+    self._generation = 0
+    self._segment = None
+    super().__init__(num_columns, initial_size, dtype, track_cells)
+
+  def _allocate(self, max_rows: int) -> np.ndarray:
+    self._datastore.begin_write()
+    self._generation += 1
+    self._segment = self._datastore.create_segment(
+      max_rows * self._num_columns * self._dtype.itemsize, f"{self.slot}_{self._generation}")
+    data = np.ndarray((max_rows, self._num_columns), self._dtype, buffer=self._segment.buf)
+    data.fill(0)
+    return data
+
+  def _expand(self, max_rows: int):
+    old_segment = self._segment
+    super()._expand(max_rows)
+    self._datastore.publish_table(self.slot, self._segment.name, self._data)
+    if old_segment is not None:
+      self._datastore.release_segment(old_segment.name)
+
+  # Writes that reach the shared arrays mark the tick as in progress
+  def flush(self):
+    if self._pending:
+      self._datastore.begin_write()
+    super().flush()
+
+  def update_many(self, rows: List[int], col: int, values):
+    self._datastore.begin_write()
+    super().update_many(rows, col, values)
+
+  def remove_row(self, row_id: int):
+    self._datastore.begin_write()
+    super().remove_row(row_id)
+
+  def reset(self, shrink: bool = False):
+    self._datastore.begin_write()
+    super().reset(shrink)
+
+  def restore(self, snapshot):
+    self._datastore.begin_write()
+    super().restore(snapshot)
+
+
+class SharedMemoryDatastore(NumpyDatastore):
+  def __init__(self, name: str = None) -> None:
+    super().__init__()
+    self.name = name or f"nmmo_{secrets.token_hex(6)}"
+    self._segments: Dict[str, shared_memory.SharedMemory] = {}
+    self._finalizer = weakref.finalize(self, _release_all, self._segments, True)
+
+    header = self.create_segment(HEADER_DTYPE.itemsize)
+    self._header = np.ndarray((), HEADER_DTYPE, buffer=header.buf)
+    self._header.fill(0)
+
+  def create_segment(self, size: int, suffix: str = None):
+    name = self.name if suffix is None else f"{self.name}_{suffix}"
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+    self._segments[shm.name] = shm
+    _OWNED_SEGMENTS.add(shm.name)
+    return shm
+
+  def release_segment(self, name: str):
+    # Readers that still map the segment keep it until they remap
+    _release(self._segments, name, unlink=True)
+
+  def _create_table(self, num_columns: int, dtypes: List = None,
+                    capacity: int = None, track_cells: bool = False) -> DataTable:
+    slot = len(self._tables)
+    assert slot < MAX_TABLES, f"At most {MAX_TABLES} tables fit in the header"
+    self._header["num_tables"] = slot + 1
+    return SharedMemoryTable(self, slot, num_columns, capacity or 100,
+                             dtypes or np.float32, track_cells)
+
+  def register_object_type(self, object_type: str, num_colums: int,
+                           indexes: List[int] = (), dtypes: List = None,
+                           capacity: int = None, track_cells: bool = False):
+    self.begin_write()
+    super().register_object_type(
+      object_type, num_colums, indexes, dtypes, capacity, track_cells)
+    entry = self._header["tables"][self._tables[object_type].slot]
+    entry["name"] = object_type.encode()
+
+  def publish_table(self, slot: int, segment: str, data: np.ndarray):
+    entry = self._header["tables"][slot]
+    entry["segment"] = segment.encode()
+    entry["rows"], entry["cols"] = data.shape
+    entry["dtype"] = data.dtype.str.encode()
+
+  @property
+  def seq(self) -> int:
+    return int(self._header["seq"])
+
+  def begin_write(self):
+    if self._header["seq"] % 2 == 0:
+      self._header["seq"] += 1
+
+  def flush(self):
+    '''Apply the buffered writes and publish the tables to the readers'''
+    super().flush()
+    if self._header["seq"] % 2 == 1:
+      self._header["seq"] += 1
+
+  def close(self):
+    self._finalizer()
+
+
+class SharedMemoryReader:
+  '''Read-only access to the tables of a SharedMemoryDatastore from any process'''
+  def __init__(self, name: str) -> None:
+    self.name = name
+    self._segments: Dict[str, shared_memory.SharedMemory] = {}
+    self._views: Dict[str, np.ndarray] = {}
+    self._view_segments: Dict[str, str] = {}
+    self._finalizer = weakref.finalize(self, _release_all, self._segments, False)
+
+    self._segments[name] = _attach(name)
+    self._header = np.ndarray((), HEADER_DTYPE, buffer=self._segments[name].buf)
+
+  @property
+  def seq(self) -> int:
+    '''Even when the tables are consistent, odd while a tick is being written'''
+    return int(self._header["seq"])
+
+  @property
+  def tick(self) -> int:
+    '''Number of times the tables were published'''
+    return self.seq // 2
+
+  def object_types(self) -> List[str]:
+    tables = self._header["tables"][:int(self._header["num_tables"])]
+    return [entry["name"].decode() for entry in tables]
+
+  def view(self, object_type: str) -> np.ndarray:
+    '''Zero-copy, read-only view of a table. The writer keeps updating
+    it, so check seq before and after using it, or use read()'''
+    entry = self._header["tables"][self.object_types().index(object_type)]
+    segment = entry["segment"].decode()
+    if self._view_segments.get(object_type) != segment:
+      # The table is new to us, or it moved to a larger segment
+      self._views.pop(object_type, None)
+      old_segment = self._view_segments.pop(object_type, None)
+      if old_segment is not None:
+        _release(self._segments, old_segment, unlink=False)
+      self._segments[segment] = _attach(segment)
+      view = np.ndarray((int(entry["rows"]), int(entry["cols"])),
+                        np.dtype(entry["dtype"].decode()),
+                        buffer=self._segments[segment].buf)
+      view.flags.writeable = False
+      self._views[object_type] = view
+      self._view_segments[object_type] = segment
+    return self._views[object_type]
+
+  def read(self, object_types: List[str] = None, timeout: float = 1.0) -> Dict[str, np.ndarray]:
+    '''Consistent copies of the tables, all from the same published tick'''
+    object_types = object_types or self.object_types()
+    deadline = time.monotonic() + timeout
+    while True:
+      seq = self.seq
+      if seq % 2 == 0:
+        try:
+          tables = {name: self.view(name).copy() for name in object_types}
+        except FileNotFoundError:
+          # The writer moved a table while we were remapping it
+          tables = None
+        if tables is not None and self.seq == seq:
+          return tables
+      if time.monotonic() > deadline:
+        raise TimeoutError(f"No consistent read of {self.name} within {timeout}s")
+      time.sleep(0)
+
+  def close(self):
+    self._views.clear()
+    self._view_segments.clear()
+    self._finalizer()
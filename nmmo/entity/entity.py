@@ -43,7 +43,16 @@ EntityState = SerializedState.subclass(
     "prospecting_level",
     "carving_level",
     "alchemy_level",
-  ])
+  ], indexes=["id"], dtypes={
+    **{attr: np.int32 for attr in [
+      "id", "damage", "time_alive", "attacker_id", "latest_combat_tick", "gold"]},
+    **{attr: np.int16 for attr in [
+      "npc_type", "row", "col", "freeze", "item_level", "message",
+      "health", "food", "water",
+      "melee_level", "range_level", "mage_level",
+      "fishing_level", "herbalism_level", "prospecting_level",
+      "carving_level", "alchemy_level"]},
+  })
 
 EntityState.Limits = lambda config: {
   **{
@@ -79,6 +88,10 @@ EntityState.Limits = lambda config: {
   } if config.PROGRESSION_SYSTEM_ENABLED else {}),
 }
 
+# Dead entities free their rows, so the population caps the table
+EntityState.Capacity = lambda config: \
+  (config.PLAYER_N or 0) + (config.NPC_N or 0) + 1
+
 EntityState.Query = SimpleNamespace(
   # Whole table
   table=lambda ds: ds.table("Entity").where_neq(
@@ -97,6 +110,13 @@ EntityState.Query = SimpleNamespace(
     EntityState.State.attr_name_to_col["row"],
     EntityState.State.attr_name_to_col["col"],
     r, c, radius),
+
+  # The num entities nearest to an entity, itself included
+  window_nearest=lambda ds, r, c, radius, num, ent_id: ds.table("Entity").window_nearest(
+    EntityState.State.attr_name_to_col["row"],
+    EntityState.State.attr_name_to_col["col"],
+    r, c, radius, num,
+    EntityState.State.attr_name_to_col["id"], ent_id),
 )
 
 class Resources:
@@ -218,7 +238,10 @@ class Entity(EntityState):
 
     self.realm = realm
     self.config: Config = realm.config
+    self._init_state(pos, entity_id, name)
 
+  def _init_state(self, pos, entity_id, name):
+    # Everything but the record is set here, to be set again when reused
     self.policy = name
     self.entity_id = entity_id
     self.repr = None
@@ -240,7 +263,7 @@ class Entity(EntityState):
     self.status = Status(self)
     self.history = History(self)
     self.resources = Resources(self, self.config)
-    self.inventory = inventory.Inventory(realm, self)
+    self.inventory = inventory.Inventory(self.realm, self)
 
   @property
   def ent_id(self):
@@ -266,7 +289,7 @@ class Entity(EntityState):
   def update(self, realm, actions):
     '''Update occurs after actions, e.g. does not include history'''
     if self.history.damage == 0:
-      self.attacker = None
+      self.attacker = None # pylint: disable=attribute-defined-outside-init
       self.attacker_id.update(0)
 
     if realm.config.EQUIPMENT_SYSTEM_ENABLED:
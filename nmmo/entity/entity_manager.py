@@ -132,16 +132,27 @@ class PlayerManager(EntityGroup):
     self.loader  = self.realm.config.PLAYER_LOADER
     self.agents = None
     self.spawned = None
+    # The players of the last episode, reused by the next one
+    self._players = {}
 
   def reset(self):
     super().reset()
     self.agents  = self.loader(self.config)
     self.spawned = OrderedSet()
 
+  def __getstate__(self):
+    # Snapshots leave out the players kept for the next episode
+    return {**self.__dict__, '_players': {}}
+
   def spawn_individual(self, r, c, idx):
     agent = next(self.agents)
     agent      = agent(self.config, idx)
-    player     = Player(self.realm, (r, c), agent)
+    if idx in self._players:
+      player = self._players[idx]
+      player.reset((r, c), agent)
+    else:
+      player = Player(self.realm, (r, c), agent)
+      self._players[idx] = player
     super().spawn(player)
 
   def spawn(self):
@@ -6,8 +6,20 @@ class Player(entity.Entity):
   def __init__(self, realm, pos, agent):
     super().__init__(realm, pos, agent.iden, agent.policy)
 
+    # Submodules
+    self.skills = Skills(realm, self)
+    self._init_player(agent)
+
+  def reset(self, pos, agent):
+    '''Reuses the player in a new episode, in the state of a new Player'''
+    self.new_record(self.realm.datastore)
+    self._init_state(pos, agent.iden, agent.policy)
+    self.skills.reset()
+    self._init_player(agent)
+
+  def _init_player(self, agent):
     self.agent    = agent
-    self.immortal = realm.config.IMMORTAL
+    self.immortal = self.config.IMMORTAL
 
     # Scripted hooks
     self.target = None
@@ -21,12 +33,9 @@ class Player(entity.Entity):
     self.ration_level_consumed    = 0
     self.poultice_level_consumed  = 0
 
-    # Submodules
-    self.skills = Skills(realm, self)
-
     # Gold: initialize with 1 gold, like the old nmmo
     # CHECK ME: should the initial amount be in the config?
-    if realm.config.EXCHANGE_SYSTEM_ENABLED:
+    if self.config.EXCHANGE_SYSTEM_ENABLED:
       self.gold.update(1)
 
   @property
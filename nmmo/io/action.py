@@ -108,6 +108,12 @@ class Action(Node):
   def args(stim, entity, config):
     raise NotImplementedError
 
+def argument_columns(config):
+  '''The (action, argument) of each column of the array actions that
+  Env.step() takes, in the order of Env.action_space()'''
+  return [(atn, arg) for atn in sorted(Action.edges(config))
+          if atn.enabled(config) for arg in sorted(atn.edges)]
+
 
 class Move(Node):
   priority = 60
@@ -22,10 +22,23 @@ EventState = SerializedState.subclass("Event", [
   "number",
   "gold",
   "target_ent",
-])
+], indexes=["event"], dtypes={
+  **{attr: np.int32 for attr in [
+    "id", "ent_id", "tick", "number", "gold", "target_ent"]},
+  **{attr: np.int16 for attr in ["event", "type", "level"]},
+})
 
 EventAttr = EventState.State.attr_name_to_col
 
+# Events are kept for the whole episode. The scripted baselines log about
+# one event every other tick per player. Past the first few hundred ticks
+# the table grows by doubling instead of reserving long horizons upfront
+EVENTS_PER_PLAYER_TICK = 0.5
+EVENT_CAPACITY_TICKS = 256
+EventState.Capacity = lambda config: int(
+  (config.PLAYER_N or 0) * EVENTS_PER_PLAYER_TICK *
+  min(config.HORIZON, EVENT_CAPACITY_TICKS)) + 1
+
 EventState.Query = SimpleNamespace(
   table=lambda ds: ds.table("Event").where_neq(EventAttr["id"], 0),
 
@@ -65,7 +78,7 @@ class EventLogger(EventCode):
     self.attr_to_col.update(EXPLORE_COL_MAP)
 
   def reset(self):
-    EventState.State.table(self.datastore).reset()
+    EventState.State.table(self.datastore).reset(self.config.DATASTORE_SHRINK_ON_RESET)
 
   # define event logging
   def _create_event(self, entity: Entity, event_code: int):
@@ -156,9 +169,9 @@ class EventLogger(EventCode):
 
   def get_data(self, event_code=None, agents: List[int]=None):
     if event_code is None:
-      event_data = EventState.Query.table(self.datastore).astype(np.int32)
+      event_data = EventState.Query.table(self.datastore)
     elif event_code in self.valid_events:
-      event_data = EventState.Query.by_event(self.datastore, event_code).astype(np.int32)
+      event_data = EventState.Query.by_event(self.datastore, event_code)
     else:
       return None
 
@@ -1,5 +1,4 @@
 import numpy as np
-from scipy import signal
 
 from nmmo.lib.colors import Neon
 
@@ -50,6 +49,8 @@ def make_two_tone(ary, norm_std=2, preprocess='norm', invert=False, periods=1):
 
   colorized = np.zeros((R, C, 3))
   if periods != 1:
+    # scipy is slow to import, and only overlays need it
+    from scipy import signal
     ary = np.abs(signal.sawtooth(periods*3.14159*ary))
   if invert:
     colorized[:, :, 0] = ary
@@ -5,6 +5,8 @@ from abc import ABC
 from types import SimpleNamespace
 from typing import Dict
 
+import numpy as np
+
 from nmmo.datastore.serialized import SerializedState
 from nmmo.lib.colors import Tier
 from nmmo.lib.log import EventCode
@@ -30,7 +32,14 @@ ItemState = SerializedState.subclass("Item", [
 
   # Market
   "listed_price",
-])
+], indexes=["id", "owner_id", "listed_price"], dtypes={
+  **{attr: np.int32 for attr in ["id", "owner_id", "quantity", "listed_price"]},
+  **{attr: np.int16 for attr in [
+    "type_id", "level", "capacity",
+    "melee_attack", "range_attack", "mage_attack",
+    "melee_defense", "range_defense", "mage_defense",
+    "health_restore", "resource_restore", "equipped"]},
+})
 
 # TODO: These limits should be defined in the config.
 ItemState.Limits = lambda config: {
@@ -52,6 +61,11 @@ ItemState.Limits = lambda config: {
   "listed_price": (0, math.inf),
 }
 
+# Room for a full inventory per entity
+ItemState.Capacity = lambda config: \
+  ((config.PLAYER_N or 0) + (config.NPC_N or 0)) * config.ITEM_INVENTORY_CAPACITY + 1 \
+  if config.ITEM_SYSTEM_ENABLED else None
+
 ItemState.Query = SimpleNamespace(
   table=lambda ds: ds.table("Item").where_neq(
     ItemState.State.attr_name_to_col["id"], 0),
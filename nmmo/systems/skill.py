@@ -23,6 +23,10 @@ class SkillGroup:
     for skill in self.skills:
       skill.update()
 
+  def reset(self):
+    for skill in self.skills:
+      skill.reset()
+
   def packet(self):
     data = {}
     for skill in self.skills:
@@ -42,6 +46,9 @@ class Skill(abc.ABC):
 
     skill_group.skills.add(self)
 
+  def reset(self):
+    self.exp = 0
+
   def packet(self):
     data = {}
 
@@ -82,6 +89,10 @@ class NonCombatSkill(Skill):
     super().__init__(skill_group)
     self._level = Lvl(1)
 
+  def reset(self):
+    super().reset()
+    self._level = Lvl(1)
+
   @property
   def level(self):
     return self._level
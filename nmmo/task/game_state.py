@@ -185,13 +185,15 @@ class GameStateGenerator:
   def __init__(self, realm: Realm, config: Config):
     self.config = deepcopy(config)
     self.spawn_pos: Dict[int, Tuple[int, int]] = {}
+    self.reset(realm)
 
-    for ent_id, ent in realm.players.items():
-      self.spawn_pos.update( {ent_id: ent.pos} )
+  # The generator is kept across episodes, only the spawns change
+  def reset(self, realm: Realm):
+    self.spawn_pos = {ent_id: ent.pos for ent_id, ent in realm.players.items()}
 
   def generate(self, realm: Realm, env_obs: Dict[int, Observation]) -> GameState:
-    # copy the datastore, by running astype
-    entity_all = EntityState.Query.table(realm.datastore).astype(np.int16)
+    # the queries return copies of the integer tables, which are safe to keep
+    entity_all = EntityState.Query.table(realm.datastore)
 
     return GameState(
       current_tick = realm.tick,
@@ -200,7 +202,7 @@ class GameStateGenerator:
       alive_agents = list(entity_all[:, EntityAttr["id"]]),
       env_obs = env_obs,
       entity_data = entity_all,
-      item_data = ItemState.Query.table(realm.datastore).astype(np.int16),
-      event_data = EventState.Query.table(realm.datastore).astype(np.int16),
+      item_data = ItemState.Query.table(realm.datastore),
+      event_data = EventState.Query.table(realm.datastore),
       cache_result = {}
     )
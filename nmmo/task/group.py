@@ -63,6 +63,9 @@ class Group(Sequence, Set):
     return self
   def __deepcopy__(self, memo):
     return Group(self.agents, self.name)
+  def __reduce__(self):
+    # The views are rebuilt from the next game state, like in deepcopy
+    return Group, (self.agents, self.name)
 
   def description(self) -> Dict:
     return {
@@ -16,6 +16,10 @@ class InvalidTaskDefinition(Exception):
 class Task(ABC):
   """ A task is used to calculate rewards for agents in "assignee"
   """
+  # Tasks whose reset() forgets all their per-episode state set this, and
+  # are reset in place between episodes instead of copied from the originals
+  reusable = False
+
   def __init__(self,
                subject: Group,
                *args,
@@ -73,6 +77,13 @@ class Task(ABC):
     # Calculate score
     return score
 
+  def reset(self):
+    """ Forgets the progress made in an episode. Subclasses with more
+    per-episode state extend it, and set reusable
+    """
+    self._config = None
+    self._score = 0.0
+
   def _reset(self, config: Config):
     self._score = 0.0
     self._config = config
@@ -230,6 +241,20 @@ def define_task(fn: Callable) -> type[Task]:
       self._args = args
       self._kwargs = kwargs
       self.name = self._make_name(fn.__name__, args, kwargs)
+
+    def _task_args(self):
+      return [a for a in [*self._args, *self._kwargs.values()] if isinstance(a, Task)]
+
+    @property
+    def reusable(self):
+      # the tasks passed as arguments keep their own state
+      return all(t.reusable for t in self._task_args())
+
+    def reset(self):
+      super().reset()
+      for t in self._task_args():
+        t.reset()
+
     def _evaluate(self, gs: GameState) -> float:
       # pylint: disable=redefined-builtin, unused-variable
       __doc = fn.__doc__
@@ -267,6 +292,16 @@ class TaskOperator(Task):
         tasks[i] = lambda _,v=tasks[i] : v
     self._tasks = tasks
 
+  @property
+  def reusable(self):
+    return all(t.reusable for t in self._tasks if isinstance(t, Task))
+
+  def reset(self):
+    super().reset()
+    for t in self._tasks:
+      if isinstance(t, Task):
+        t.reset()
+
   def check(self, config: Config) -> bool:
     return all((t.check(config) if isinstance(t, Task) else True for t in self._tasks))
 
@@ -355,6 +390,9 @@ class Once(TaskOperator):
   def __init__(self, task: Task, subject: Group=None):
     super().__init__(lambda n: n==1, task, subject=subject)
     self._maximum_score = -math.inf
+  def reset(self):
+    super().reset()
+    self._maximum_score = -math.inf
   def _evaluate(self, gs: GameState) -> float:
     self._maximum_score = max(self._maximum_score, self._tasks[0](gs))
     return self._maximum_score
@@ -365,6 +403,9 @@ class Repeat(TaskOperator):
   def __init__(self, task: Task, subject: Group=None):
     super().__init__(lambda n: n==1, task, subject=subject)
     self._current_score = 0
+  def reset(self):
+    super().reset()
+    self._current_score = 0
   def _evaluate(self, gs: GameState) -> float:
     self._current_score += self._tasks[0](gs)
     return self._current_score
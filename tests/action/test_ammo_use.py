@@ -138,7 +138,7 @@ class TestAmmoUse(ScriptedTestTemplate):
     env.obs = env._compute_observations()
 
     # First tick actions: SELL level-0 ammo
-    env.step({ ent_id: { action.Sell:
+    obs, _, _, _ = env.step({ ent_id: { action.Sell:
         { action.InventoryItem: env.obs[ent_id].inventory.sig(ent_ammo, 0),
           action.Price: sell_price } }
         for ent_id, ent_ammo in self.ammo.items() })
@@ -149,6 +149,9 @@ class TestAmmoUse(ScriptedTestTemplate):
       inventory = env.obs[ent_id].inventory
       inv_idx = inventory.sig(ent_ammo, 0)
       item_info = ItemState.parse_array(inventory.values[inv_idx])
+      # the masks made by step() for all agents at once are the same
+      np.testing.assert_array_equal(obs[ent_id]['ActionTargets'][action.Buy][action.MarketItem],
+                                    gym_obs['ActionTargets'][action.Buy][action.MarketItem])
       # ItemState data
       self.assertEqual(sell_price, item_info.listed_price)
       # Exchange listing
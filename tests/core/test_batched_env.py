@@ -0,0 +1,135 @@
+import unittest
+
+import random
+import numpy as np
+
+import nmmo
+from nmmo.entity.entity import EntityState
+from nmmo.core.observation import make_action_targets, pad_ragged
+from nmmo.io import action
+from tests.testhelpers import ScriptedAgentTestConfig
+
+TEST_HORIZON = 30
+RANDOM_SEED = random.randint(0, 10000)
+
+class Config(ScriptedAgentTestConfig):
+  PROVIDE_ACTION_TARGETS = True
+  SAVE_REPLAY = False
+
+def copy_obs(obs):
+  if isinstance(obs, dict):
+    return {key: copy_obs(val) for key, val in obs.items()}
+  return np.array(obs)
+
+class TestBatchedEnv(unittest.TestCase):
+  def test_same_as_env(self):
+    config = Config()
+    env = nmmo.Env(config, RANDOM_SEED)
+    steps = [(copy_obs(env.reset(seed=RANDOM_SEED)), {}, {})]
+    for _ in range(TEST_HORIZON):
+      obs, rewards, dones, _ = env.step({})
+      steps.append((copy_obs(obs), rewards, set(env._dead_agents))) # pylint: disable=protected-access
+
+    env = nmmo.BatchedEnv(config, RANDOM_SEED)
+    self.assertListEqual(list(env.agent_ids), env.possible_agents)
+    batches = [(copy_obs(env.reset(seed=RANDOM_SEED)), None, None)]
+    for _ in range(TEST_HORIZON):
+      obs, rewards, dones, _ = env.step({})
+      batches.append((copy_obs(obs), rewards.copy(), dones.copy()))
+
+    for (obs, rewards, dead), (batch, batch_rewards, batch_dones) in zip(steps, batches):
+      for slot, agent_id in enumerate(env.possible_agents):
+        self.assertEqual(batch["Mask"][slot], agent_id in obs)
+        if agent_id not in obs:
+          self.assertFalse(batch["Tile"][slot].any())
+          continue
+
+        agent_obs = obs[agent_id]
+        for key in ["Tile", "Entity", "Inventory", "Market"]:
+          self.assertEqual(batch[key].dtype, np.float32)
+          np.testing.assert_array_equal(batch[key][slot], agent_obs[key])
+        self.assertEqual(batch["CurrentTick"][slot], agent_obs["CurrentTick"][0])
+        for atn, masks in agent_obs["ActionTargets"].items():
+          for arg, mask in masks.items():
+            np.testing.assert_array_equal(batch["ActionTargets"][atn][arg][slot], mask)
+
+      if batch_rewards is not None:
+        np.testing.assert_array_equal(
+          batch_rewards, [rewards.get(eid, 0) for eid in env.possible_agents])
+        np.testing.assert_array_equal(
+          batch_dones, [eid in dead for eid in env.possible_agents])
+
+  def test_action_targets(self):
+    # the masks made for all agents at once match the per-agent ones
+    env = nmmo.Env(Config(), RANDOM_SEED)
+    obs = env.reset(seed=RANDOM_SEED)
+    for _ in range(TEST_HORIZON):
+      for agent_id, agent_obs in obs.items():
+        expected = env.obs[agent_id]._make_action_targets() # pylint: disable=protected-access
+        self.assertEqual(agent_obs["ActionTargets"].keys(), expected.keys())
+        for atn, masks in expected.items():
+          for arg, mask in masks.items():
+            np.testing.assert_array_equal(agent_obs["ActionTargets"][atn][arg], mask)
+      obs, _, _, _ = env.step({})
+
+  def test_action_targets_without_self(self):
+    # an agent missing from its own entity observation has no valid targets,
+    #   in every tile format
+    for tile_format in ["list", "grid", "onehot"]:
+      with self.subTest(tile_format=tile_format):
+        config = Config()
+        config.TILE_OBS_FORMAT = tile_format
+        env = nmmo.Env(config, RANDOM_SEED)
+        obs = env.reset(seed=RANDOM_SEED)
+        agents = list(obs)[:2]
+        def stack(key, agents=agents, obs=obs):
+          return np.stack([obs[agent_id][key] for agent_id in agents])
+        entities = stack("Entity")
+        # drop the agent's row, so that its first row is another entity
+        own = entities[1][:, EntityState.State.attr_name_to_col["id"]] == agents[1]
+        entities[1] = np.concatenate([entities[1][~own], np.zeros_like(entities[1][own])])
+        self.assertNotEqual(entities[1][0, EntityState.State.attr_name_to_col["id"]], 0)
+
+        masks = make_action_targets(config, env.realm.tick, agents, stack("Tile"), entities,
+                                    stack("Inventory"), obs[agents[0]]["Market"])
+        self.assertTrue(masks[action.Move][action.Direction][0].any())
+        # the arguments that are always allowed are not targets
+        always = [(action.Attack, action.Style), (action.Sell, action.Price),
+                  (action.Comm, action.Token)]
+        for atn, args in obs[agents[0]]["ActionTargets"].items():
+          for arg, mask in args.items():
+            np.testing.assert_array_equal(masks[atn][arg][0], mask)
+            if (atn, arg) not in always:
+              self.assertFalse(masks[atn][arg][1].any(), f"{atn.__name__} {arg.__name__}")
+
+  def test_ragged_entities(self):
+    config = Config()
+    env = nmmo.BatchedEnv(config, RANDOM_SEED)
+    padded = [copy_obs(env.reset(seed=RANDOM_SEED))]
+    for _ in range(TEST_HORIZON):
+      padded.append(copy_obs(env.step({})[0]))
+
+    config = Config()
+    config.OBS_RAGGED_ENTITIES = True
+    env = nmmo.BatchedEnv(config, RANDOM_SEED)
+    ragged = [env.reset(seed=RANDOM_SEED)]
+    for _ in range(TEST_HORIZON):
+      ragged.append(env.step({})[0])
+
+    for batch, ragged_batch in zip(padded, ragged):
+      self.assertNotIn("Entity", ragged_batch)
+      values, offsets = ragged_batch["EntityValues"], ragged_batch["EntityOffsets"]
+      self.assertEqual(values.dtype, np.float32)
+      self.assertEqual(len(offsets), len(env.possible_agents) + 1)
+      for slot in range(len(env.possible_agents)):
+        rows = values[offsets[slot]:offsets[slot+1]]
+        self.assertFalse(batch["Entity"][slot, len(rows):].any())
+        np.testing.assert_array_equal(rows, batch["Entity"][slot, :len(rows)])
+      np.testing.assert_array_equal(
+        pad_ragged(values, offsets, config.PLAYER_N_OBS), batch["Entity"])
+      for atn, masks in batch["ActionTargets"].items():
+        for arg, mask in masks.items():
+          np.testing.assert_array_equal(ragged_batch["ActionTargets"][atn][arg], mask)
+
+if __name__ == '__main__':
+  unittest.main()
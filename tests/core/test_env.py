@@ -3,12 +3,15 @@ import unittest
 from typing import List
 
 import random
+import numpy as np
 from tqdm import tqdm
 
 import nmmo
+from nmmo.core.observation import LazyObs
 from nmmo.core.realm import Realm
 from nmmo.core.tile import TileState
 from nmmo.entity.entity import Entity, EntityState
+from nmmo.lib import material
 from nmmo.systems.item import ItemState
 from scripted import baselines
 
@@ -150,5 +153,268 @@ class TestEnv(unittest.TestCase):
 
     self.assertTrue(ItemState.State.table(new_env.realm.datastore).is_empty())
 
+  def test_reset_to_other_map(self):
+    config = Config()
+    config.MAP_N = 2
+    # both envs are built first, since each generates the maps
+    env = nmmo.Env(config, RANDOM_SEED)
+    fresh_env = nmmo.Env(config, RANDOM_SEED)
+
+    # only the current map is kept, as tile materials
+    env.reset(map_id=1)
+    env.reset(map_id=2)
+    fresh_env.reset(map_id=2)
+    self.assertEqual(env.realm.map._materials.dtype, np.int16)
+    np.testing.assert_array_equal(env.realm.map.repr, fresh_env.realm.map.repr)
+
+  def test_warm_reset(self):
+    env = nmmo.Env(self.config, RANDOM_SEED)
+
+    def rollout():
+      obs = env.reset(seed=RANDOM_SEED)
+      # copy the observations, since the buffers are refilled every step
+      steps = [({a: {k: np.array(v) for k, v in o.items()} for a, o in obs.items()}, {})]
+      for _ in range(TEST_HORIZON):
+        obs, rewards, _, _ = env.step({})
+        steps.append(({a: {k: np.array(v) for k, v in o.items()} for a, o in obs.items()},
+                      rewards))
+      return steps
+
+    # the first reset loads everything, the second reuses the tiles, players
+    #   and tasks of the first episode
+    expected = rollout()
+    players = dict(env.realm.players._players)
+    tasks = env.tasks
+    steps = rollout()
+    self.assertTrue(all(env.realm.players._players[idx] is player
+                        for idx, player in players.items()))
+    self.assertIs(env.tasks, tasks)
+
+    for (expected_obs, expected_rewards), (step_obs, rewards) in zip(expected, steps):
+      self.assertEqual(rewards, expected_rewards)
+      self.assertEqual(step_obs.keys(), expected_obs.keys())
+      for agent_id, agent_obs in step_obs.items():
+        for key, val in agent_obs.items():
+          np.testing.assert_array_equal(val, expected_obs[agent_id][key])
+
+  def test_reset_reuses_players(self):
+    env = nmmo.Env(self.config, RANDOM_SEED)
+    env.reset(seed=RANDOM_SEED)
+    for _ in range(3):
+      env.step({})
+
+    # references kept from the last episode see the new one
+    player = env.realm.players[1]
+    self.assertEqual(player.time_alive.val, 3)
+    env.reset(seed=RANDOM_SEED)
+    self.assertIs(env.realm.players[1], player)
+    self.assertEqual(player.time_alive.val, 0)
+    self.assertEqual(player.ent_id, 1)
+
+  def test_observation_tile(self):
+    self.env.reset()
+    radius = self.config.PLAYER_VISION_RADIUS
+    deltas = np.arange(-radius - 1, radius + 2)
+    for _ in range(3):
+      for ob in self.env.obs.values():
+        agent = ob.agent()
+        self.assertEqual(ob.tile_grid.shape, (2*radius + 1, 2*radius + 1))
+        for r_delta in deltas:
+          for c_delta in deltas:
+            row, col = agent.row + r_delta, agent.col + c_delta
+            in_sight = max(abs(r_delta), abs(c_delta)) <= radius
+            in_map = 0 <= row < self.config.MAP_SIZE and 0 <= col < self.config.MAP_SIZE
+            if in_sight and in_map:
+              expected = self.env.realm.map.tiles[int(row), int(col)].material_id.val
+            else:
+              expected = material.Lava.index
+            self.assertEqual(ob.tile(r_delta, c_delta).material_id, expected)
+        materials = ob.tile_materials(deltas[:, None], deltas[None, :])
+        self.assertEqual(materials.shape, (len(deltas), len(deltas)))
+        np.testing.assert_array_equal(materials[1:-1, 1:-1], ob.tile_grid)
+        self.assertTrue(np.all(materials[[0, -1], :] == material.Lava.index))
+      self.env.step({})
+
+  def test_obs_buffers(self):
+    def rollout(config):
+      env = nmmo.Env(config, RANDOM_SEED)
+      obs = env.reset(seed=RANDOM_SEED)
+      # copy the observations, since the buffers are refilled every step
+      steps = [{a: {k: np.array(v) for k, v in o.items()} for a, o in obs.items()}]
+      for _ in range(TEST_HORIZON):
+        obs, _, _, _ = env.step({})
+        steps.append({a: {k: np.array(v) for k, v in o.items()} for a, o in obs.items()})
+      return env, obs, steps
+
+    _, _, expected = rollout(self.config)
+    buffered_config = Config()
+    buffered_config.OBS_BUFFERS = True
+    env, last_obs, steps = rollout(buffered_config)
+
+    for step_obs, buffered_obs in zip(expected, steps):
+      self.assertEqual(step_obs.keys(), buffered_obs.keys())
+      for agent_id, agent_obs in buffered_obs.items():
+        for key, val in agent_obs.items():
+          np.testing.assert_array_equal(val, step_obs[agent_id][key])
+
+    for agent_obs in last_obs.values():
+      for key, block in env._obs_buffers.blocks.items():
+        self.assertEqual(agent_obs[key].dtype, np.float32)
+        self.assertTrue(np.shares_memory(agent_obs[key], block))
+      self.assertIs(agent_obs["Market"], env._obs_buffers.market)
+
+  def test_shared_market(self):
+    obs = self.env.reset()
+    for _ in range(3):
+      markets = [agent_obs["Market"] for agent_obs in obs.values()]
+      # one read-only array for all agents
+      self.assertTrue(all(market is markets[0] for market in markets))
+      self.assertFalse(markets[0].flags.writeable)
+      self.assertEqual(markets[0].shape,
+                       (self.config.MARKET_N_OBS, ItemState.State.num_attributes))
+      obs, _, _, _ = self.env.step({})
+
+  def test_tile_obs_format(self):
+    for tile_format in ["grid", "onehot"]:
+      for obs_buffers in [False, True]:
+        config = Config()
+        config.PROVIDE_ACTION_TARGETS = True
+        config.TILE_OBS_FORMAT = tile_format
+        config.OBS_BUFFERS = obs_buffers
+        env = nmmo.Env(config, RANDOM_SEED)
+        obs = env.reset(seed=RANDOM_SEED)
+        space = env.observation_space(1)["Tile"]
+        for _ in range(5):
+          for agent_id, agent_obs in obs.items():
+            tiles = agent_obs["Tile"]
+            self.assertEqual(tiles.shape, space.shape)
+            self.assertEqual(tiles.dtype, np.int8)
+            self.assertTrue(space.contains(np.array(tiles)))
+
+            # the same materials as the tile list, lava outside the map
+            ob = env.obs[agent_id]
+            grid = tiles[..., 0] if tile_format == "grid" else tiles.argmax(axis=-1)
+            radius = config.PLAYER_VISION_RADIUS
+            deltas = np.arange(-radius, radius + 1)
+            np.testing.assert_array_equal(
+              grid, [[ob.tile(r, c).material_id for c in deltas] for r in deltas])
+
+            # the batched masks read the tensors
+            np.testing.assert_array_equal(
+              agent_obs["ActionTargets"][nmmo.action.Move][nmmo.action.Direction],
+              ob._make_move_mask())
+          obs, _, _, _ = env.step({})
+
+  def test_obs_nearest(self):
+    config = Config()
+    config.PLAYER_OBS_NEAREST = True
+    config.PLAYER_N_OBS = 3
+    env = nmmo.Env(config, RANDOM_SEED)
+    env.reset(seed=RANDOM_SEED)
+    radius = config.PLAYER_VISION_RADIUS
+
+    row_col = [EntityState.State.attr_name_to_col["row"],
+               EntityState.State.attr_name_to_col["col"]]
+    for _ in range(TEST_HORIZON):
+      for agent_id, ob in env.obs.items():
+        agent = env.realm.players[agent_id]
+        pos = np.array([agent.row.val, agent.col.val])
+        visible = Entity.Query.window(env.realm.datastore, *pos, radius)
+        distance = np.abs(visible[:, row_col] - pos).max(axis=1)
+
+        observed = ob.entities.values
+        self.assertEqual(len(observed), min(len(visible), config.PLAYER_N_OBS))
+        self.assertEqual(ob.entities.ids[0], agent_id)
+        observed_distance = np.abs(observed[:, row_col] - pos).max(axis=1)
+        self.assertTrue(np.all(np.diff(observed_distance[1:]) >= 0))
+        # no entity left out is nearer than one observed
+        np.testing.assert_array_equal(
+          np.sort(observed_distance), np.sort(distance)[:len(observed)])
+      env.step({})
+
+  def test_obs_lazy(self):
+    def rollout(config):
+      env = nmmo.Env(config, RANDOM_SEED)
+      steps = [env.reset(seed=RANDOM_SEED)]
+      for _ in range(TEST_HORIZON):
+        steps.append(env.step({})[0])
+      return steps
+
+    config = Config()
+    config.PROVIDE_ACTION_TARGETS = True
+    expected = rollout(config)
+    lazy_config = Config()
+    lazy_config.PROVIDE_ACTION_TARGETS = True
+    lazy_config.OBS_LAZY = True
+    steps = rollout(lazy_config)
+
+    for step_obs, lazy_obs in zip(expected, steps):
+      self.assertEqual(step_obs.keys(), lazy_obs.keys())
+      for agent_id, agent_obs in lazy_obs.items():
+        self.assertIsInstance(agent_obs, LazyObs)
+        # nothing is computed until it is read
+        self.assertEqual(agent_obs._values, {})
+        self.assertEqual(agent_obs.keys(), step_obs[agent_id].keys())
+        for key, val in agent_obs.items():
+          if key == "ActionTargets":
+            for atn, args in val.items():
+              for arg, mask in args.items():
+                np.testing.assert_array_equal(
+                  mask, step_obs[agent_id][key][atn][arg], f"{atn} {arg}")
+          else:
+            np.testing.assert_array_equal(val, step_obs[agent_id][key])
+        self.assertIs(agent_obs["Tile"], agent_obs["Tile"])
+
+  def test_array_actions(self):
+    config = Config()
+    config.PLAYERS = [nmmo.Agent]
+    config.PROVIDE_ACTION_TARGETS = True
+    columns = nmmo.action.argument_columns(config)
+    rng = np.random.RandomState(RANDOM_SEED)
+
+    # actions sampled from the masks, taken as arrays
+    env = nmmo.Env(config, RANDOM_SEED)
+    obs = env.reset(seed=RANDOM_SEED)
+    steps, atn_dicts = [], []
+    for _ in range(TEST_HORIZON):
+      actions = np.full((len(env.possible_agents), len(columns)), -1, dtype=np.int32)
+      atn_dict = {}
+      for slot, agent_id in enumerate(env.possible_agents):
+        if agent_id not in obs:
+          continue
+        atn_dict[agent_id] = {}
+        for col, (atn, arg) in enumerate(columns):
+          valid = np.flatnonzero(obs[agent_id]["ActionTargets"][atn][arg])
+          if len(valid) == 0 or rng.rand() < 0.3:
+            continue
+          actions[slot, col] = val = rng.choice(valid)
+          if arg is nmmo.action.Target:
+            val = int(env.obs[agent_id].entities.ids[val])
+          atn_dict[agent_id].setdefault(atn, {})[arg] = val
+      atn_dicts.append(atn_dict)
+      obs = env.step(actions)[0]
+      steps.append({agent_id: {key: agent_obs[key].copy() for key in ["Tile", "Entity", "Inventory"]}
+                    for agent_id, agent_obs in obs.items()})
+
+    # array actions with a negative argument are not taken
+    decoded = env._decode_actions(np.full(actions.shape, -1))
+    self.assertEqual(decoded, {agent_id: {} for agent_id in env.obs})
+
+    # the same rollout with the action dicts, of deserialize() inputs
+    #   the new env makes new Price and Token edges
+    env = nmmo.Env(config, RANDOM_SEED)
+    obs = env.reset(seed=RANDOM_SEED)
+    for step_obs, atn_dict in zip(steps, atn_dicts):
+      for agent_id, atns in atn_dict.items():
+        atn_dict[agent_id] = {
+          atn: {arg: arg.edges[val] if arg.argType is nmmo.action.Fixed else val
+                for arg, val in args.items()}
+          for atn, args in atns.items() if len(args) == len(atn.edges)}
+      obs = env.step(atn_dict)[0]
+      self.assertEqual(obs.keys(), step_obs.keys())
+      for agent_id, agent_obs in obs.items():
+        for key in ["Tile", "Entity", "Inventory"]:
+          np.testing.assert_array_equal(agent_obs[key], step_obs[agent_id][key])
+
 if __name__ == '__main__':
   unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import os
 import shutil
+import tempfile
 
 import nmmo
 
@@ -23,6 +24,24 @@ class TestMapGeneration(unittest.TestCase):
     test_env.reset(map_id = 25)
 
     # this should finish without error
+  def test_textures_for_previews_only(self):
+    config = nmmo.config.Small()
+    config.MAP_N = 1
+
+    # pylint: disable=protected-access
+    with tempfile.TemporaryDirectory() as path_maps:
+      config.PATH_MAPS = path_maps
+      map_generator = config.MAP_GENERATOR(config)
+      map_generator.generate_all_maps()
+      self.assertIsNone(map_generator._textures)
+      self.assertTrue(os.path.exists(os.path.join(path_maps, 'map1', 'map.npy')))
+      self.assertFalse(os.path.exists(os.path.join(path_maps, 'map1', 'map.png')))
+
+      config.MAP_GENERATE_PREVIEWS = True
+      map_generator = config.MAP_GENERATOR(config)
+      map_generator.generate_all_maps()
+      self.assertIsNotNone(map_generator._textures)
+      self.assertTrue(os.path.exists(os.path.join(path_maps, 'map1', 'map.png')))
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import random
+
+from tests.testhelpers import ScriptedAgentTestConfig, ScriptedAgentTestEnv
+from tests.testhelpers import observations_are_equal, actions_are_equal
+
+TEST_HORIZON = 20
+RANDOM_SEED = random.randint(0, 10000)
+
+def rollout(env, horizon):
+  steps = []
+  for _ in range(horizon):
+    obs, rewards, dones, _ = env.step({})
+    npcs = {nid: npc.packet() for nid, npc in env.realm.npcs.items()}
+    steps.append((obs, env.actions, rewards, dones, npcs))
+  return steps
+
+class TestSnapshot(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.config = ScriptedAgentTestConfig()
+    cls.env = ScriptedAgentTestEnv(cls.config)
+    cls.env.reset(seed=RANDOM_SEED)
+    rollout(cls.env, TEST_HORIZON)
+
+    cls.snapshot = cls.env.snapshot()
+    cls.obs_src = {a: o.to_gym() for a, o in cls.env.obs.items()}
+    cls.steps_src = rollout(cls.env, TEST_HORIZON)
+
+  def assert_same_rollout(self, steps):
+    self.assertEqual(len(steps), len(self.steps_src))
+    for src, rep in zip(self.steps_src, steps):
+      self.assertTrue(observations_are_equal(src[0], rep[0]))
+      self.assertTrue(actions_are_equal(src[1], rep[1]))
+      self.assertDictEqual(src[2], rep[2])
+      self.assertDictEqual(src[3], rep[3])
+      self.assertDictEqual(src[4], rep[4])
+
+  def test_restore(self):
+    obs = self.env.restore(self.snapshot)
+    self.assertEqual(self.env.realm.tick, self.snapshot.tick)
+    self.assertTrue(observations_are_equal(self.obs_src, obs))
+    self.assert_same_rollout(rollout(self.env, TEST_HORIZON))
+
+    # the same snapshot can be restored again
+    self.env.restore(self.snapshot)
+    self.assert_same_rollout(rollout(self.env, TEST_HORIZON))
+
+  def test_restore_after_reset(self):
+    self.env.reset(seed=RANDOM_SEED + 1)
+    rollout(self.env, 5)
+
+    self.env.restore(self.snapshot)
+    self.assert_same_rollout(rollout(self.env, TEST_HORIZON))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import random
+import numpy as np
+
+import nmmo
+from tests.testhelpers import ScriptedAgentTestConfig
+
+TEST_HORIZON = 10
+RANDOM_SEED = random.randint(0, 10000)
+
+class Config(ScriptedAgentTestConfig):
+  PROVIDE_ACTION_TARGETS = True
+  SAVE_REPLAY = False
+
+class LoadMapsConfig(Config):
+  MAP_FORCE_GENERATION = False
+
+class ShortConfig(Config):
+  HORIZON = 5
+
+class LoadMapsShortConfig(ShortConfig):
+  MAP_FORCE_GENERATION = False
+
+def copy_obs(obs):
+  if isinstance(obs, dict):
+    return {key: copy_obs(val) for key, val in obs.items()}
+  return np.array(obs)
+
+class TestVecEnv(unittest.TestCase):
+  def test_same_as_batched_env(self):
+    vec = nmmo.VecEnv(Config(), num_envs=2, seed=RANDOM_SEED)
+
+    # each env runs alone, as it does in its worker: envs share the global RNG
+    #   and load the maps the VecEnv generated
+    config = LoadMapsConfig()
+    steps = []
+    for i in range(2):
+      env = nmmo.BatchedEnv(config, RANDOM_SEED + i)
+      steps.append([(copy_obs(env.reset(seed=RANDOM_SEED + i)), None, None)])
+      for _ in range(TEST_HORIZON):
+        obs, rewards, dones, _ = env.step({})
+        steps[i].append((copy_obs(obs), rewards.copy(), dones.copy()))
+
+    try:
+      self.assertListEqual(vec.possible_agents, env.possible_agents)
+      results = [(vec.reset(), None, None)]
+      for _ in range(TEST_HORIZON):
+        # no actions from the learner, the scripted agents still act
+        results.append(vec.step())
+
+        obs, rewards, dones = results[-1]
+        for i, env_steps in enumerate(steps):
+          batch, batch_rewards, batch_dones = env_steps[len(results) - 1]
+          for key in ["Tile", "Entity", "Inventory", "CurrentTick", "AgentId", "Mask"]:
+            self.assertEqual(obs[key].dtype, batch[key].dtype)
+            np.testing.assert_array_equal(obs[key][i], batch[key])
+          np.testing.assert_array_equal(obs["Market"][i], batch["Market"][0])
+          for atn, masks in batch["ActionTargets"].items():
+            for arg, mask in masks.items():
+              np.testing.assert_array_equal(obs["ActionTargets"][atn][arg][i], mask)
+          np.testing.assert_array_equal(rewards[i], batch_rewards)
+          np.testing.assert_array_equal(dones[i], batch_dones)
+    finally:
+      vec.close()
+
+  def test_auto_reset(self):
+    vec = nmmo.VecEnv(ShortConfig(), seed=RANDOM_SEED, auto_reset=True)
+
+    env = nmmo.BatchedEnv(LoadMapsShortConfig(), RANDOM_SEED)
+    steps = [copy_obs(env.reset(seed=RANDOM_SEED))]
+    for _ in range(ShortConfig.HORIZON):
+      steps.append(copy_obs(env.step({})[0]))
+    steps.append(copy_obs(env.reset()))
+    steps.append(copy_obs(env.step({})[0]))
+
+    try:
+      vec.reset()
+      for step, batch in enumerate(steps[1:], 1):
+        vec.step_async()
+        obs, rewards, dones = vec.step_wait()
+        np.testing.assert_array_equal(obs["Entity"][0], batch["Entity"])
+        np.testing.assert_array_equal(obs["CurrentTick"][0], batch["CurrentTick"])
+        # all done at the horizon, and the next step starts the new episode
+        self.assertEqual(dones[0].all(), step == ShortConfig.HORIZON)
+        if step == ShortConfig.HORIZON + 1:
+          self.assertFalse(rewards[0].any())
+          self.assertFalse(obs["CurrentTick"][0].any())
+    finally:
+      vec.close()
+
+if __name__ == '__main__':
+  unittest.main()
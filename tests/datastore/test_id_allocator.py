@@ -60,5 +60,17 @@ class TestIdAllocator(unittest.TestCase):
     id_allocator.remove(10)
     self.assertEqual(id_allocator.allocate(), 10)
 
+  def test_allocation_order(self):
+    id_allocator = IdAllocator(6)
+    self.assertListEqual([id_allocator.allocate() for _ in range(3)], [1, 2, 3])
+
+    # freed and newly expanded ids queue up in the order they became free
+    id_allocator.remove(3)
+    id_allocator.remove(1)
+    id_allocator.remove(1) # freeing twice is a no-op
+    id_allocator.expand(7)
+    self.assertListEqual([id_allocator.allocate() for _ in range(5)], [4, 5, 3, 1, 6])
+    self.assertTrue(id_allocator.full())
+
 if __name__ == '__main__':
   unittest.main()
@@ -1,3 +1,4 @@
+import random
 import unittest
 
 import numpy as np
@@ -28,6 +29,47 @@ class TestNumpyTable(unittest.TestCase):
       np.array([[0, 0, 0], [11, 12, 0], [51, 0, 53]], dtype=np.int32)
     )
 
+  def test_column_dtypes(self):
+    table = NumpyTable(3, 10, [np.int8, np.int16, np.int32])
+    self.assertEqual(table._data.dtype, np.int32)
+
+    # integer columns saturate at the bounds of their own dtype
+    table.update(2, 0, 300)
+    table.update(2, 1, -40000)
+    table.update(2, 2, 40000)
+    np.testing.assert_array_equal(
+      table.get([2]), np.array([[127, -32768, 40000]], dtype=np.int32))
+
+    # values a column cannot hold match nothing, with or without an index
+    table.add_index(2)
+    row_id = table.add_row()
+    table.update(row_id, 2, 3)
+    self.assertEqual(len(table.where_eq(2, 3.5)), 0)
+    self.assertEqual(len(table.where_in(2, [3.5, 2**40])), 0)
+    np.testing.assert_array_equal(table.where_eq(2, 3.0), table.get([row_id]))
+
+  def test_buffered_writes(self):
+    table = NumpyTable(3, 10, np.int32)
+    table.add_index(1)
+    row_id = table.add_row()
+    table.update(row_id, 0, 1)
+    table.update(row_id, 0, 2) # the latest write wins
+    table.update(row_id, 1, 5)
+    np.testing.assert_array_equal(table.get([row_id]), [[2, 5, 0]])
+
+    # pending writes to a removed row are dropped
+    table.update(row_id, 2, 7)
+    table.remove_row(row_id)
+    self.assertTrue(table.is_empty())
+
+    rows = [table.add_row() for _ in range(3)]
+    table.update(rows[0], 1, 9)
+    table.update_many(rows, 1, [4, 5, 6])
+    table.update_many(rows[1:], 2, 8)
+    np.testing.assert_array_equal(table.get(rows), [[0, 4, 0], [0, 5, 8], [0, 6, 8]])
+    np.testing.assert_array_equal(table.where_eq(1, 5), [[0, 5, 8]])
+    self.assertEqual(len(table.where_eq(1, 9)), 0)
+
   def test_expand(self):
     table = NumpyTable(3, 10, np.float32)
 
@@ -43,5 +85,206 @@ class TestNumpyTable(unittest.TestCase):
       np.array([[10.1, 0, 0], [2.1, 0, 0]], dtype=np.float32)
     )
 
+  def test_reset(self):
+    table = NumpyTable(3, 10, np.float32)
+    for _ in range(30):
+      table.update(table.add_row(), 0, 1)
+    self.assertEqual(table._max_rows, 40)
+
+    # the buffer is zero-filled and kept for the next episode
+    data = table._data
+    table.reset()
+    self.assertIs(table._data, data)
+    self.assertTrue(table.is_empty())
+    self.assertEqual(table.add_row(), 1)
+
+    # shrinking keeps twice the rows used since the last reset
+    for _ in range(6):
+      table.add_row()
+    table.reset(shrink=True)
+    self.assertEqual(table._max_rows, 16)
+    self.assertTrue(table.is_empty())
+
+    # but never goes below the initial size
+    table.reset(shrink=True)
+    self.assertEqual(table._max_rows, 10)
+    self.assertEqual(table.add_row(), 1)
+
+  def test_changes_since(self):
+    table = NumpyTable(3, 10, np.int32, track_cells=True)
+    rows = [table.add_row() for _ in range(4)]
+    for row_id in rows:
+      table.update(row_id, 0, row_id)
+
+    table.begin_tick(1)
+    table.update(rows[0], 1, 5)
+    table.update(rows[1], 0, rows[1]) # same value, not a change
+    table.update_many(rows[2:], 2, [7, 0])
+    np.testing.assert_array_equal(table.changes_since(0), [rows[0], rows[2]])
+
+    table.begin_tick(2)
+    table.remove_row(rows[3])
+    new_row = table.add_row()
+    changed, cols = table.changes_since(1, columns=True)
+    np.testing.assert_array_equal(changed, [rows[3], new_row])
+    np.testing.assert_array_equal(cols, [[True, True, True], [False, False, False]])
+
+    # earlier ticks see all the changes since
+    np.testing.assert_array_equal(
+      table.changes_since(0), [rows[0], rows[2], rows[3], new_row])
+    self.assertEqual(len(table.changes_since(2)), 0)
+
+  def test_changes_since_untracked_cells(self):
+    # by default only rows are tracked, and all their cells count as changed
+    table = NumpyTable(3, 10, np.int32)
+    self.assertIsNone(table._cell_tick)
+    rows = [table.add_row() for _ in range(3)]
+    table.begin_tick(1)
+    table.update(rows[1], 2, 4)
+    table.update_many(rows, 0, [0, 0, 6])
+    changed, cols = table.changes_since(0, columns=True)
+    np.testing.assert_array_equal(changed, rows[1:])
+    self.assertTrue(cols.all())
+    self.assertEqual(cols.shape, (2, 3))
+
+  def test_window_spatial_index(self):
+    # the indexed table must return the same rows as a full scan
+    #   windows never reach (0, 0), where the padding and free rows are
+    plain = NumpyTable(3, 10, np.float32)
+    indexed = NumpyTable(3, 10, np.float32)
+    indexed.add_spatial_index(0, 1, 4)
+
+    rng = random.Random(0)
+    rows = []
+    for _ in range(50):
+      row_id = plain.add_row()
+      self.assertEqual(row_id, indexed.add_row())
+      rows.append(row_id)
+      pos = (rng.randint(1, 39), rng.randint(1, 39))
+      for table in [plain, indexed]:
+        table.update(row_id, 0, pos[0])
+        table.update(row_id, 1, pos[1])
+        table.update(row_id, 2, row_id)
+
+    for step in range(200):
+      row_id = rng.choice(rows)
+      col, value = rng.randint(0, 1), rng.randint(1, 39)
+      for table in [plain, indexed]:
+        table.update(row_id, col, value)
+
+      if step % 20 == 0:
+        row_id = rows.pop(rng.randrange(len(rows)))
+        for table in [plain, indexed]:
+          table.remove_row(row_id)
+
+      r, c = rng.randint(8, 39), rng.randint(8, 39)
+      np.testing.assert_array_equal(
+        indexed.window(0, 1, r, c, 7),
+        plain.window(0, 1, r, c, 7))
+
+  def test_window_nearest(self):
+    rng = random.Random(0)
+    for spatial_index in [False, True]:
+      table = NumpyTable(3, 10, np.float32)
+      if spatial_index:
+        table.add_spatial_index(0, 1, 4)
+      for _ in range(60):
+        row_id = table.add_row()
+        table.update(row_id, 0, rng.randint(1, 39))
+        table.update(row_id, 1, rng.randint(1, 39))
+        table.update(row_id, 2, row_id)
+
+      for _ in range(50):
+        r, c = rng.randint(8, 39), rng.randint(8, 39)
+        window = table.window(0, 1, r, c, 7)
+        distance = np.maximum(np.abs(window[:, 0] - r), np.abs(window[:, 1] - c))
+        for num in [1, 3, len(window), len(window) + 5]:
+          # nearest first, in row order among equals
+          expected = window[np.argsort(distance, kind='stable')][:num]
+          np.testing.assert_array_equal(
+            table.window_nearest(0, 1, r, c, 7, num), expected)
+
+        # the center row comes first, even when others are as near
+        if len(window) > 0:
+          center = window[-1]
+          nearest = table.window_nearest(0, 1, center[0], center[1], 7, 1, 2, center[2])
+          np.testing.assert_array_equal(nearest, [center])
+
+  def test_windows_grid_index(self):
+    size, radius = 10, 2
+    rng = random.Random(0)
+    table = NumpyTable(3, size * size + 1, np.int16)
+    for r in range(size):
+      for c in range(size):
+        row_id = table.add_row()
+        for col, value in enumerate([r, c, rng.randint(1, 5)]):
+          table.update(row_id, col, value)
+    table.add_grid_index(0, 1, size)
+
+    # window() slices the grid, and matches a scan of the table, also
+    #   at the edges and off the grid
+    data = table.get(range(1, size * size + 1))
+    for r, c in [(-3, 4), (0, 0), (3, 9), (5, 5), (9, 9), (12, 1)]:
+      inside = (np.abs(data[:, 0] - r) <= radius) & (np.abs(data[:, 1] - c) <= radius)
+      self.assertEqual(table.window(0, 1, r, c, radius).tobytes(), data[inside].tobytes())
+
+    # batched windows match window() byte for byte
+    centers = [(r, c) for r in range(size) for c in range(size)]
+    rows, cols = zip(*centers)
+    for (r, c), window in zip(centers, table.windows(0, 1, rows, cols, radius)):
+      expected = table.window(0, 1, r, c, radius)
+      self.assertEqual(window.dtype, expected.dtype)
+      self.assertEqual(window.tobytes(), expected.tobytes())
+
+    # grids of the values around each center, -1 outside the grid
+    values = table.get(range(1, size * size + 1))[:, 2].reshape(size, size)
+    padded = np.pad(values, radius, constant_values=-1)
+    expected = [padded[r:r + 2*radius + 1, c:c + 2*radius + 1] for r, c in centers]
+    grids = table.grid_windows(0, 1, 2, rows, cols, radius, -1)
+    np.testing.assert_array_equal(grids, expected)
+
+    # moving a cell breaks the grid, and windows fall back to window()
+    table.update(12, 1, 5)
+    for (r, c), window in zip(centers, table.windows(0, 1, rows, cols, radius)):
+      np.testing.assert_array_equal(window, table.window(0, 1, r, c, radius))
+    table.update(12, 1, 1)
+    np.testing.assert_array_equal(table.grid_windows(0, 1, 2, rows, cols, radius, -1), expected)
+
+  def test_hash_index(self):
+    # the indexed table must return the same rows as a full scan
+    plain = NumpyTable(3, 10000, np.float32)
+    indexed = NumpyTable(3, 10000, np.float32)
+    indexed.add_index(1)
+
+    rng = random.Random(0)
+    rows = []
+    for step in range(300):
+      if step % 3 == 0 or not rows:
+        row_id = plain.add_row()
+        self.assertEqual(row_id, indexed.add_row())
+        rows.append(row_id)
+        for table in [plain, indexed]:
+          table.update(row_id, 0, row_id)
+
+      row_id = rng.choice(rows)
+      value = rng.randint(0, 5)
+      for table in [plain, indexed]:
+        table.update(row_id, 1, value)
+
+      if step % 10 == 0:
+        row_id = rows.pop(rng.randrange(len(rows)))
+        for table in [plain, indexed]:
+          table.remove_row(row_id)
+
+      value = rng.randint(1, 5)
+      np.testing.assert_array_equal(
+        indexed.where_eq(1, value), plain.where_eq(1, value))
+      np.testing.assert_array_equal(
+        indexed.where_eq(1, np.float32(value)), plain.where_eq(1, value))
+      np.testing.assert_array_equal(
+        indexed.where_in(1, [value, value, 5]), plain.where_in(1, [value, 5]))
+      np.testing.assert_array_equal(
+        indexed.where_neq(1, 0), plain.where_neq(1, 0))
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,79 @@
+import multiprocessing as mp
+import unittest
+
+import numpy as np
+
+from nmmo.datastore.shared_memory_datastore import SharedMemoryDatastore, SharedMemoryReader
+
+
+def read_in_subprocess(name, queue):
+  reader = SharedMemoryReader(name)
+  queue.put((reader.tick, reader.read()))
+  reader.close()
+
+class TestSharedMemoryDatastore(unittest.TestCase):
+  def setUp(self):
+    self.datastore = SharedMemoryDatastore()
+    self.datastore.register_object_type("Foo", 3, dtypes=[np.int32] * 3)
+    self.datastore.register_object_type("Bar", 2)
+    self.table = self.datastore.table("Foo")
+
+  def tearDown(self):
+    self.datastore.close()
+
+  def test_seqlock(self):
+    reader = SharedMemoryReader(self.datastore.name)
+    self.assertListEqual(reader.object_types(), ["Foo", "Bar"])
+
+    record = self.datastore.create_record("Foo")
+    record.update(1, 5)
+    self.datastore.flush()
+    tick = reader.tick
+    np.testing.assert_array_equal(reader.read(["Foo"])["Foo"][record.id], [0, 5, 0])
+
+    # an unpublished write makes the tables inconsistent until the next flush
+    record.update(1, 6)
+    self.table.get([record.id])
+    self.assertEqual(reader.seq % 2, 1)
+    with self.assertRaises(TimeoutError):
+      reader.read(timeout=0.01)
+
+    self.datastore.flush()
+    self.assertEqual(reader.tick, tick + 1)
+    view = reader.view("Foo")
+    self.assertEqual(view[record.id, 1], 6)
+    self.assertFalse(view.flags.writeable)
+    reader.close()
+
+  def test_expand_remaps_readers(self):
+    reader = SharedMemoryReader(self.datastore.name)
+    self.datastore.flush()
+    self.assertEqual(reader.view("Foo").shape, (100, 3))
+
+    records = [self.datastore.create_record("Foo") for _ in range(150)]
+    for record in records:
+      record.update(0, record.id)
+    self.datastore.flush()
+
+    table = reader.read(["Foo"])["Foo"]
+    self.assertEqual(table.shape, (200, 3))
+    np.testing.assert_array_equal(table[1:151, 0], np.arange(1, 151))
+    reader.close()
+
+  def test_read_from_another_process(self):
+    record = self.datastore.create_record("Bar")
+    record.update(1, 2.5)
+    self.datastore.flush()
+
+    queue = mp.get_context("spawn").Queue()
+    proc = mp.get_context("spawn").Process(
+      target=read_in_subprocess, args=(self.datastore.name, queue))
+    proc.start()
+    tick, tables = queue.get(timeout=60)
+    proc.join()
+
+    self.assertEqual(tick, SharedMemoryReader(self.datastore.name).tick)
+    np.testing.assert_array_equal(tables["Bar"], self.datastore.table("Bar").get(slice(None)))
+
+if __name__ == '__main__':
+  unittest.main()
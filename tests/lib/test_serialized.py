@@ -23,6 +23,9 @@ class MockDatastoreRecord():
   def update(self, name, value):
     self._data[name] = value
 
+  def write_buffer(self, name):
+    return None
+
 class MockDatastore():
   def create_record(self, name):
     return MockDatastoreRecord()
@@ -52,5 +55,18 @@ class TestSerialized(unittest.TestCase):
     state.a.update(a_max + 100)
     self.assertEqual(state.a.val, a_max)
 
+  def test_attribute_views(self):
+    state = FooState(MockDatastore(), FooState.Limits)
+
+    # attribute views share the record's values and limits
+    state.b.update(3)
+    state.b.increment(2)
+    self.assertEqual(state.b.val, 5)
+    self.assertEqual(state.a.max, 10)
+    self.assertFalse(hasattr(state, '__dict__'))
+
+    other = FooState(MockDatastore(), FooState.Limits)
+    self.assertEqual(other.b.val, 0)
+
 if __name__ == '__main__':
   unittest.main()
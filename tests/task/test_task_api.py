@@ -6,7 +6,7 @@ import numpy as np
 
 import nmmo
 from nmmo.core.env import Env
-from nmmo.task.task_api import define_predicate, define_task
+from nmmo.task.task_api import define_predicate, define_task, Once, Repeat, Task
 from nmmo.task.group import Group
 from nmmo.task.team_helper import TeamHelper
 from nmmo.task.constraint import InvalidConstraint, ScalarConstraint
@@ -27,6 +27,20 @@ def Failure(gs, subject: Group):
 def Fake(gs, subject, a,b,c):
   return False
 
+@define_task
+def Wrap(gs, subject, task):
+  return task(gs)
+
+class Counter(Task):
+  """A user-defined task with per-episode state, and no reset()"""
+  def __init__(self, subject: Group):
+    super().__init__(subject, constraints=[])
+    self.evaluations = 0
+
+  def _evaluate(self, gs):
+    self.evaluations += 1
+    return self.evaluations
+
 class MockGameState():
   def __init__(self):
     # pylint: disable=super-init-not-called
@@ -68,6 +82,55 @@ class TestTaskAPI(unittest.TestCase):
 
     self.assertEqual(task6.name, "(PAND_(IMPLY_(Failure_(0,))_(Failure_(0,)))_(Success_(0,)))")
 
+  def test_task_reset(self):
+    mock_gs = MockGameState()
+    def tick():
+      # every tick has its own cache
+      mock_gs.cache_result = {}
+      return mock_gs
+
+    task = Repeat(Success(Group([0]))) + Once(Failure(Group([0])))
+    for _ in range(2):
+      # the same rewards in every episode
+      self.assertEqual(task.compute_rewards(tick())[0], {0: 1.0})
+      self.assertEqual(task.compute_rewards(tick())[0], {0: 1.0})
+      self.assertEqual(task(tick()), 3)
+      task.reset()
+
+  def test_function_task_reset(self):
+    mock_gs = MockGameState()
+    def tick():
+      mock_gs.cache_result = {}
+      return mock_gs
+
+    # tasks passed as arguments are reset with the function task
+    task = Wrap(Group([0]), Repeat(Success(Group([0]))))
+    self.assertTrue(task.reusable)
+    for _ in range(2):
+      self.assertEqual(task(tick()), 1)
+      self.assertEqual(task(tick()), 2)
+      task.reset()
+
+    # and copied instead, if they cannot be reset
+    self.assertFalse(Wrap(Group([0]), Counter(Group([0]))).reusable)
+
+  def test_stateful_task_across_resets(self):
+    # user tasks are copied every episode, and start from a clean slate
+    env = Env(ScriptedAgentTestConfig())
+    counter = Counter(Group([1]))
+    self.assertFalse(counter.reusable)
+    self.assertFalse((Repeat(Success(Group([1]))) + counter).reusable)
+    self.assertTrue((Repeat(Success(Group([1]))) + Once(Failure(Group([1])))).reusable)
+
+    env.change_task([counter, Repeat(Success(Group([1])))])
+    for _ in range(2):
+      for tick in range(1, 4):
+        _, _, _, infos = env.step({})
+        self.assertEqual(infos[1]['task'][counter.name], tick)
+        self.assertEqual(infos[1]['task'][Repeat(Success(Group([1]))).name], tick)
+      env.reset()
+    self.assertEqual(counter.evaluations, 0)
+
   def test_team_assignment(self):
     team =  Group([1, 2, 8, 9], "TeamFoo")
 
@@ -1,8 +1,18 @@
 
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+from ordered_set import OrderedSet
+
 import nmmo
 from nmmo.core.config import (NPC, AllGameSystems, Combat, Communication,
                               Equipment, Exchange, Item, Medium, Profession,
                               Progression, Resource, Small, Terrain)
+from nmmo.datastore.id_allocator import IdAllocator
 from scripted import baselines
 
 
@@ -43,6 +53,47 @@ def test_small_env_reset(benchmark):
   env = nmmo.Env(config)
   benchmark(lambda: env.reset(map_id=1))
 
+def test_small_env_restore(benchmark):
+  config = Small()
+  config.PLAYERS = [baselines.Random]
+  env = nmmo.Env(config)
+  env.reset(map_id=1)
+  for _ in range(10):
+    env.step({})
+  snapshot = env.snapshot()
+  benchmark(lambda: env.restore(snapshot))
+
+# Startup of a short-lived worker process: a new interpreter imports nmmo,
+#   then builds an env on the existing maps and takes its first step
+STARTUP = '''
+import sys, time
+start = time.perf_counter()
+import nmmo
+imported = time.perf_counter()
+if sys.argv[1] == 'first_step':
+  config = nmmo.config.Small()
+  config.MAP_FORCE_GENERATION = False
+  env = nmmo.Env(config)
+  env.reset(map_id=1)
+  env.step({})
+print(imported - start, time.perf_counter() - start)
+'''
+
+@pytest.mark.parametrize('stage', ['import', 'first_step'])
+def test_startup_small(benchmark, stage):
+  nmmo.Env(Small()) # generates the maps
+  path = os.path.dirname(os.path.dirname(nmmo.__file__))
+  env = {**os.environ, 'PYTHONPATH': os.pathsep.join([path, os.environ.get('PYTHONPATH', '')])}
+
+  def startup():
+    out = subprocess.run([sys.executable, '-c', STARTUP, stage], env=env,
+                         check=True, capture_output=True, text=True).stdout
+    return [float(val) for val in out.split()[-2:]]
+
+  import_time, stage_time = benchmark.pedantic(startup, rounds=5)
+  benchmark.extra_info['import_time'] = import_time
+  benchmark.extra_info['stage_time'] = stage_time
+
 def test_fps_base_small_1_pop(benchmark):
   benchmark_config(benchmark, Small, 1)
 
@@ -100,6 +151,154 @@ def test_fps_no_npc_med_100_pop(benchmark):
 def test_fps_all_med_100_pop(benchmark):
   benchmark_config(benchmark, Medium, 100, AllGameSystems)
 
+# Scripted populations read the Observation objects, not the gym observations
+@pytest.mark.parametrize('lazy', [False, True])
+def test_fps_scripted_med_100_pop(benchmark, lazy):
+  conf = create_config(Medium, AllGameSystems)
+  conf.PLAYER_N = 100
+  conf.PLAYERS = [baselines.Melee, baselines.Range, baselines.Mage, baselines.Fisher]
+  conf.PROVIDE_ACTION_TARGETS = True
+  conf.SPECIALIZE = True
+  conf.OBS_LAZY = lazy
+
+  env = nmmo.Env(conf)
+  env.reset()
+
+  benchmark(env.step, actions={})
+
+
+# Decoding the actions of all agents, as one array or as action dicts
+@pytest.mark.parametrize('array', [False, True])
+def test_decode_actions_med_100_pop(benchmark, array):
+  conf = create_config(Medium, AllGameSystems)
+  conf.PLAYER_N = 100
+  conf.PLAYERS = [nmmo.Agent]
+  conf.PROVIDE_ACTION_TARGETS = True
+
+  env = nmmo.Env(conf)
+  obs = env.reset(seed=0)
+  for _ in range(10):
+    obs = env.step({})[0]
+
+  # every agent takes every action it can, on the first valid target
+  columns = nmmo.action.argument_columns(conf)
+  actions = np.full((len(env.possible_agents), len(columns)), -1, dtype=np.int32)
+  atn_dicts = {}
+  for slot, agent_id in enumerate(env.possible_agents):
+    if agent_id not in obs:
+      continue
+    atn_dicts[agent_id] = {}
+    for col, (atn, arg) in enumerate(columns):
+      valid = np.flatnonzero(obs[agent_id]["ActionTargets"][atn][arg])
+      if len(valid) > 0:
+        actions[slot, col] = valid[0]
+        val = int(env.obs[agent_id].entities.ids[valid[0]]) if arg is nmmo.action.Target \
+          else arg.edges[valid[0]] if arg.argType is nmmo.action.Fixed else int(valid[0])
+        atn_dicts[agent_id].setdefault(atn, {})[arg] = val
+
+  # pylint: disable=protected-access
+  if array:
+    benchmark(env._decode_actions, actions)
+  else:
+    benchmark(env._validate_actions, atn_dicts)
+
+
+# Steps per second of a VecEnv scale with its workers, up to the cores
+@pytest.mark.parametrize('num_envs', [1, 2, 4])
+def test_fps_vec_env_small_all(benchmark, num_envs):
+  conf = create_config(Small, AllGameSystems)
+  conf.PLAYERS = [baselines.Random]
+  conf.PROVIDE_ACTION_TARGETS = True
+
+  vec = nmmo.VecEnv(conf, num_envs, seed=0)
+  vec.reset()
+  benchmark(vec.step)
+  benchmark.extra_info['env_steps_per_second'] = num_envs / benchmark.stats.stats.median
+  vec.close()
+
+
+# Startup of a VecEnv, where the envs are only built in the workers
+@pytest.mark.parametrize('num_envs', [1, 4])
+def test_vec_env_startup_small_all(benchmark, num_envs):
+  conf = create_config(Small, AllGameSystems)
+  conf.PLAYERS = [baselines.Random]
+  conf.PROVIDE_ACTION_TARGETS = True
+  nmmo.Env(conf) # generate the maps, which the VecEnv would regenerate
+  conf.MAP_FORCE_GENERATION = False
+
+  def startup():
+    vec = nmmo.VecEnv(conf, num_envs, seed=0)
+    vec.reset()
+    vec.close()
+
+  benchmark.pedantic(startup, rounds=3)
+
+
+# Episodes of a learner that waits on a device: with auto_reset, the next
+#   episode is prepared during that wait instead of in a blocking reset()
+@pytest.mark.parametrize('auto_reset', [False, True])
+def test_vec_env_episode_small_all(benchmark, auto_reset):
+  conf = create_config(Small, AllGameSystems)
+  conf.PLAYERS = [baselines.Random]
+  horizon = 16
+  conf.HORIZON = horizon
+  learner_time = 0.02
+
+  def episode():
+    for _ in range(horizon):
+      vec.step_async()
+      time.sleep(learner_time)
+      vec.step_wait()
+    if auto_reset:
+      vec.step_async()
+      time.sleep(learner_time)
+      vec.step_wait()
+    else:
+      vec.reset()
+      time.sleep(learner_time)
+
+  vec = nmmo.VecEnv(conf, seed=0, auto_reset=auto_reset)
+  vec.reset()
+  benchmark.pedantic(episode, rounds=5)
+  vec.close()
+
+
+# Datastore id allocation, against the OrderedSet allocator it replaced
+class OrderedSetIdAllocator:
+  def __init__(self, max_id):
+    self.max_id = 1
+    self.free = OrderedSet()
+    self.expand(max_id)
+
+  def remove(self, row_id):
+    self.free.add(row_id)
+
+  def allocate(self):
+    return self.free.pop(0)
+
+  def expand(self, max_id):
+    self.free.update(OrderedSet(range(self.max_id, max_id)))
+    self.max_id = max_id
+
+def churn_ids(allocator, num_ops=100):
+  ids = [allocator.allocate() for _ in range(num_ops)]
+  for row_id in ids:
+    allocator.remove(row_id)
+
+@pytest.mark.parametrize('num_rows', [10**5, 10**6])
+@pytest.mark.parametrize('allocator_cls', [IdAllocator, OrderedSetIdAllocator])
+def test_id_allocator_churn(benchmark, allocator_cls, num_rows):
+  allocator = allocator_cls(num_rows)
+  benchmark(churn_ids, allocator)
+
+@pytest.mark.parametrize('num_rows', [10**5, 10**6])
+@pytest.mark.parametrize('allocator_cls', [IdAllocator, OrderedSetIdAllocator])
+def test_id_allocator_expand(benchmark, allocator_cls, num_rows):
+  def expand():
+    allocator = allocator_cls(num_rows // 2)
+    allocator.expand(num_rows)
+  benchmark(expand)
+
 
 '''
 def benchmark_env(benchmark, env, nent):